@@ -0,0 +1,270 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import datetime
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+
+SONG_INTERVAL = 210
+
+# path patterns used to group request counts per endpoint
+ENDPOINTS = (
+    ("POST", re.compile(r"^/oauth/v1/accesstoken$"), "srf_token"),
+    ("GET", re.compile(r"^/audiometadata/v2/radio/songlist$"), "srf_songlist"),
+    ("GET", re.compile(r"^/audiometadata/v2/radio/channels$"), "srf_channels"),
+    ("GET", re.compile(r"^/spotify/v1/search$"), "spotify_search"),
+    ("GET", re.compile(r"^/spotify/v1/playlists/[^/]+$"), "spotify_playlist"),
+    ("GET", re.compile(r"^/spotify/v1/playlists/[^/]+/items$"), "spotify_playlist_items"),
+    ("POST", re.compile(r"^/spotify/v1/playlists/[^/]+/items$"), "spotify_playlist_add"),
+    ("DELETE", re.compile(r"^/spotify/v1/playlists/[^/]+/items$"), "spotify_playlist_remove"),
+)
+
+
+class FakeState:
+
+    def __init__(
+        self,
+        *,
+        start: int,
+        catalog_size: int,
+        latency: float,
+        search_rate: float,
+        miss_ratio: float,
+        page_size: int,
+        seed: int,
+    ):
+        self.now: int = start
+        self.latency: float = latency
+        self.search_rate: float = search_rate
+        self.page_size: int = page_size
+        self.requests: Counter = Counter()
+        self.bytes_sent: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.playlists: Dict[str, List[str]] = {}
+        self.snapshots: Dict[str, int] = {}
+
+        rng = random.Random(seed)
+        self.catalog: List[Tuple[str, str]] = [
+            (f"Title {i}", f"Artist {i % 97}") for i in range(catalog_size)
+        ]
+        self.missing: set = {i for i in range(catalog_size) if rng.random() < miss_ratio}
+        # a few songs are played a lot, like on the radio
+        self.weights: List[float] = [1 / (i + 1) for i in range(catalog_size)]
+        self.seed: int = seed
+
+        self._search_tokens: float = search_rate
+        self._search_updated_at: float = time.monotonic()
+
+    def song_at(self, slot: int) -> Dict[str, Any]:
+        # the songlist is a pure function of the slot, so every request sees the same history
+        i = random.Random(self.seed * 1_000_003 + slot).choices(range(len(self.catalog)), self.weights)[0]
+        title, artist = self.catalog[i]
+        played_at = slot * SONG_INTERVAL
+        date = datetime.datetime.fromtimestamp(played_at, datetime.timezone.utc).astimezone()
+        return {"date": date.isoformat(), "title": title, "artist": {"name": artist}, "duration": 180000}
+
+    def songlist(self, *, from_ts: Optional[int], to_ts: Optional[int]) -> List[Dict[str, Any]]:
+        # newest first like the real api
+        to_ts = min(to_ts if to_ts is not None else self.now, self.now)
+        last_slot = to_ts // SONG_INTERVAL
+        first_slot = (from_ts // SONG_INTERVAL) if from_ts is not None else last_slot - self.page_size + 1
+        return [self.song_at(slot) for slot in range(last_slot, first_slot - 1, -1)]
+
+    def take_search_token(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self._search_updated_at
+            self._search_tokens = min(self.search_rate, self._search_tokens + elapsed * self.search_rate)
+            self._search_updated_at = now
+            if self._search_tokens >= 1:
+                self._search_tokens -= 1
+                return True
+            return False
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+
+    state: FakeState
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, data: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        # a 304 has no body
+        body = json.dumps(data).encode() if status != 304 else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.state.lock:
+            self.state.bytes_sent += len(body)
+
+    def _body(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return parse_qs(raw.decode())
+
+    def _handle(self, method: str) -> None:
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self._body()
+
+        if url.path.startswith("/__"):
+            return self._handle_control(method, url.path, body)
+
+        name = next((name for m, p, name in ENDPOINTS if m == method and p.match(url.path)), None)
+        if name is None:
+            error = {"error": {"status": 404, "message": f"unknown endpoint {method} {url.path}"}}
+            return self._send(404, error)
+
+        with self.state.lock:
+            self.state.requests[name] += 1
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+        getattr(self, f"_{name}")(url.path, query, body)
+
+    def _handle_control(self, method: str, path: str, body: Any) -> None:
+        if path == "/__stats":
+            with self.state.lock:
+                data = {"requests": dict(self.state.requests), "bytes_sent": self.state.bytes_sent}
+            return self._send(200, data)
+        elif path == "/__advance":
+            self.state.now += body["seconds"]
+            return self._send(200, {"now": self.state.now})
+        elif path == "/__reset":
+            with self.state.lock:
+                self.state.requests.clear()
+                self.state.bytes_sent = 0
+            return self._send(200, {})
+        return self._send(404, {})
+
+    def _srf_token(self, path: str, query: Dict[str, str], body: Any) -> None:
+        self._send(200, {"access_token": "srf-token", "expires_in": 3600, "token_type": "Bearer"})
+
+    def _srf_channels(self, path: str, query: Dict[str, str], body: Any) -> None:
+        self._send(200, {"channelList": [{"id": query.get("channelId", "virus"), "title": "SRF Virus"}]})
+
+    def _srf_songlist(self, path: str, query: Dict[str, str], body: Any) -> None:
+        from_ts = int(datetime.datetime.fromisoformat(query["from"]).timestamp()) if "from" in query else None
+        to_ts = int(datetime.datetime.fromisoformat(query["to"]).timestamp()) if "to" in query else None
+        songs = self.state.songlist(from_ts=from_ts, to_ts=to_ts)
+
+        if from_ts is None:
+            # the newest song identifies the default page
+            etag = f'"{songs[0]["date"]}"' if songs else '"empty"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, None, {"ETag": etag})
+            return self._send(200, {"songList": songs}, {"ETag": etag})
+
+        page_size = int(query.get("pageSize", 20))
+        offset = int(query.get("next", 0))
+        data: Dict[str, Any] = {"songList": songs[offset : offset + page_size]}
+        if offset + page_size < len(songs):
+            data["next"] = str(offset + page_size)
+        self._send(200, data)
+
+    def _spotify_search(self, path: str, query: Dict[str, str], body: Any) -> None:
+        if not self.state.take_search_token():
+            error = {"error": {"status": 429, "message": "rate limited"}}
+            return self._send(429, error, {"Retry-After": "1"})
+
+        match = re.match(r"^Title (\d+)", query.get("q", ""))
+        items = []
+        if match and int(match.group(1)) not in self.state.missing:
+            items.append({"uri": f"spotify:track:{int(match.group(1)):022d}"})
+        self._send(200, {"tracks": {"items": items}})
+
+    def _playlist_id(self, path: str) -> str:
+        return path.split("/")[4]
+
+    def _snapshot(self, playlist_id: str) -> str:
+        return f"snapshot-{self.state.snapshots.get(playlist_id, 0)}"
+
+    def _spotify_playlist(self, path: str, query: Dict[str, str], body: Any) -> None:
+        playlist_id = self._playlist_id(path)
+        self._send(200, {"id": playlist_id, "snapshot_id": self._snapshot(playlist_id)})
+
+    def _spotify_playlist_items(self, path: str, query: Dict[str, str], body: Any) -> None:
+        playlist_id = self._playlist_id(path)
+        uris = self.state.playlists.get(playlist_id, [])
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", 100))
+        items = [{"track": {"uri": uri}} for uri in uris[offset : offset + limit]]
+        next_page = None if offset + limit >= len(uris) else "x"
+        self._send(200, {"items": items, "total": len(uris), "next": next_page})
+
+    def _change_playlist(self, playlist_id: str, *, add: List[str], remove: List[str]) -> None:
+        if len(add) > 100 or len(remove) > 100:
+            return self._send(400, {"error": {"status": 400, "message": "too many items"}})
+
+        with self.state.lock:
+            uris = self.state.playlists.setdefault(playlist_id, [])
+            uris.extend(add)
+            if remove:
+                self.state.playlists[playlist_id] = [uri for uri in uris if uri not in set(remove)]
+            self.state.snapshots[playlist_id] = self.state.snapshots.get(playlist_id, 0) + 1
+        self._send(201, {"snapshot_id": self._snapshot(playlist_id)})
+
+    def _spotify_playlist_add(self, path: str, query: Dict[str, str], body: Any) -> None:
+        # spotipy sends a plain list, the web api documents {"uris": [...]}
+        uris = body if isinstance(body, list) else body["uris"]
+        self._change_playlist(self._playlist_id(path), add=uris, remove=[])
+
+    def _spotify_playlist_remove(self, path: str, query: Dict[str, str], body: Any) -> None:
+        self._change_playlist(self._playlist_id(path), add=[], remove=[t["uri"] for t in body["items"]])
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_DELETE(self) -> None:
+        self._handle("DELETE")
+
+
+def serve(port: int, config: Dict[str, Any]) -> None:
+    handler = type("Handler", (FakeHandler,), {"state": FakeState(**config)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.serve_forever()
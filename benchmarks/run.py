@@ -0,0 +1,277 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict, Optional, Tuple
+
+from .fake_servers import serve
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TICK_INTERVAL = 15 * 60
+TOKEN_LIFETIME = 30 * 24 * 60 * 60
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _control(base_url: str, path: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    body = json.dumps(data).encode() if data is not None else None
+    request = urllib.request.Request(f"{base_url}{path}", data=body, method="POST" if body else "GET")
+    request.add_header("Content-Type", "application/json")
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def _written_bytes() -> int:
+    # bytes the storage layer wrote in this process, unlike wchar it leaves out logs and sockets
+    from srfvirus_spotify.metrics import metrics
+
+    return int(metrics.get("storage_written_bytes"))
+
+
+def _read_written_bytes(path: str) -> Optional[int]:
+    # a run-once child exports its counters on close, they only cover that one tick
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith("storage_written_bytes_total "):
+                    return int(float(line.split()[1]))
+    except OSError:
+        return None
+    return 0
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _prepare_env(base_url: str) -> None:
+    os.environ.update(
+        {
+            "SRF_BASE_URL": base_url,
+            "SPOTIFY_API_BASE_URL": f"{base_url}/spotify/v1",
+            "SRF_CLIENT_ID": "bench",
+            "SRF_CLIENT_SECRET": "bench",
+            "SPOTIFY_CLIENT_ID": "bench",
+            "SPOTIFY_CLIENT_SECRET": "bench",
+            # spotipy only accepts ids which look like real ones
+            "SPOTIFY_TRENDING_NOW_PLAYLIST_ID": "trendingnow".ljust(22, "0"),
+            "SPOTIFY_TOP_100_PLAYLIST_ID": "top100".ljust(22, "0"),
+            "SPOTIFY_NIGHT_OUT_PLAYLIST_ID": "nightout".ljust(22, "0"),
+        }
+    )
+
+    # the authorization code flow can't run unattended, the token outlasts any run so it's never refreshed
+    os.makedirs(".cache", exist_ok=True)
+    with open(".cache/.spotify_token", "w") as f:
+        json.dump(
+            {
+                "access_token": "spotify-token",
+                "token_type": "Bearer",
+                "expires_in": TOKEN_LIFETIME,
+                "expires_at": int(time.time()) + TOKEN_LIFETIME,
+                "refresh_token": "refresh",
+                "scope": "playlist-modify-private playlist-modify-public playlist-read-private",
+            },
+            f,
+        )
+
+
+def _run_process() -> Tuple[Dict[str, float], Optional[int]]:
+    # a fresh interpreter per tick like a cron job, returns the durations reported by --timings
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT}
+    metrics_path = os.path.abspath("./metrics/srfvirus_spotify.prom")
+    if os.path.exists(metrics_path):
+        os.remove(metrics_path)
+    completed = subprocess.run(
+        [sys.executable, "-m", "srfvirus_spotify", "run-once", "--timings"],
+        env=env,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in completed.stderr.splitlines()[-6:]:
+        phase, seconds, *_ = line.split()
+        timings[phase] = float(seconds.rstrip("s"))
+    return timings, _read_written_bytes(metrics_path)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    # start far enough in the past so the fake songlist never runs ahead of the real clock
+    start = int(time.time()) - args.ticks * TICK_INTERVAL - 3600
+    config = {
+        "start": start,
+        "catalog_size": args.catalog_size,
+        "latency": args.latency,
+        "search_rate": args.search_rate,
+        "miss_ratio": args.miss_ratio,
+        "page_size": args.page_size,
+        "seed": args.seed,
+    }
+    server = multiprocessing.Process(target=serve, args=(port, config), daemon=True)
+    server.start()
+
+    # storage paths are relative, so the run happens in a scratch directory which is removed afterwards
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="srfvirus-bench-")
+    os.chdir(workdir)
+    _prepare_env(base_url)
+
+    for _ in range(50):
+        try:
+            _control(base_url, "/__stats")
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    # imported late so Env picks up the stand-in urls
+    sys.path.insert(0, REPO_ROOT)
+    from srfvirus_spotify.app import App
+
+    def create_app() -> Any:
+        if args.mode == "async":
+            from srfvirus_spotify.aio import AsyncApp
+
+            return AsyncApp()
+        return App()
+
+    ticks = []
+    warm_app = None
+    try:
+        if args.mode in ("daemon", "async"):
+            warm_app = create_app()
+        for i in range(args.ticks):
+            _control(base_url, "/__reset", {})
+            written_before = _written_bytes()
+            started_at = time.perf_counter()
+            timings = None
+            bytes_written: Optional[int] = None
+
+            if warm_app is not None:
+                warm_app.tick()
+            elif args.mode == "process":
+                timings, bytes_written = _run_process()
+            else:
+                app = create_app()
+                try:
+                    app.tick()
+                finally:
+                    app.close()
+
+            wall_time = time.perf_counter() - started_at
+            if args.mode != "process":
+                bytes_written = _written_bytes() - written_before
+            stats = _control(base_url, "/__stats")
+            ticks.append(
+                {
+                    "tick": i,
+                    "wall_time": wall_time,
+                    "requests": stats["requests"],
+                    "bytes_received": stats["bytes_sent"],
+                    "timings": timings,
+                    "bytes_written": bytes_written,
+                }
+            )
+            _control(base_url, "/__advance", {"seconds": TICK_INTERVAL})
+
+        # kilobytes on linux, in process mode the largest of the run-once children, read before the
+        # stand-in server process is reaped
+        peak_rss_kb = resource.getrusage(
+            resource.RUSAGE_CHILDREN if args.mode == "process" else resource.RUSAGE_SELF
+        ).ru_maxrss
+        storage_bytes = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(workdir) for name in names
+        )
+    finally:
+        if warm_app is not None:
+            warm_app.close()
+        server.terminate()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    requests_total: Dict[str, int] = {}
+    for tick in ticks:
+        for name, count in tick["requests"].items():
+            requests_total[name] = requests_total.get(name, 0) + count
+
+    return {
+        "commit": _commit(),
+        "mode": args.mode,
+        "config": {**config, "ticks": args.ticks},
+        "ticks": ticks,
+        "totals": {
+            "wall_time": sum(tick["wall_time"] for tick in ticks),
+            "requests": requests_total,
+            "bytes_written": sum(tick["bytes_written"] or 0 for tick in ticks),
+            "peak_rss_kb": peak_rss_kb,
+            "storage_bytes": storage_bytes,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="run ticks against local stand-in SRF and Spotify servers")
+    parser.add_argument("--mode", choices=("cold", "daemon", "async", "process"), default="cold")
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--search-rate", type=float, default=10, help="searches per second before 429")
+    parser.add_argument("--catalog-size", type=int, default=500)
+    parser.add_argument("--miss-ratio", type=float, default=0.05, help="share of songs Spotify doesn't have")
+    parser.add_argument("--page-size", type=int, default=20, help="songs on the default songlist page")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the json result to this file instead of stdout")
+    args = parser.parse_args()
+
+    result = run(args)
+    data = json.dumps(result, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
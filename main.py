@@ -22,62 +22,121 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+from __future__ import annotations
+
+import argparse
 import logging
 import datetime
-import os
-import time
-
-import sentry_sdk as sentry
-from apscheduler.schedulers.blocking import BlockingScheduler
 
-from srfvirus_spotify.srf import SRF, TrendingNowCollection, Top100Collection, NightOutCollection
-from srfvirus_spotify.env import Env
+from srfvirus_spotify.cli import create_app, setup
+from srfvirus_spotify.scheduler import PollScheduler, tick_lock
 
 
 logger = logging.getLogger(__name__)
 
 
-def setup() -> None:
-    ignore_errors = [KeyboardInterrupt]
-    sentry.init(
-        dsn=Env.SENTRY_DSN,
-        ignore_errors=ignore_errors,
-    )
-
-    log_path = "./logs/logging.log"
-    if not os.path.exists(log_path):
-        os.makedirs(os.path.dirname(log_path), exist_ok=True)
-
-    logging.basicConfig(
-        format="%(asctime)s %(name)s %(levelname)s %(message)s",
-        datefmt="%d.%m.%y %H:%M:%S %Z",
-        level=logging.INFO,
-        handlers=[logging.FileHandler(log_path), logging.StreamHandler()],
-    )
-
-
-scheduler = BlockingScheduler()
-
-
-@scheduler.scheduled_job("interval", minutes=15, next_run_time=datetime.datetime.now())
-def main():
-    srf = SRF()
-    trending_now = TrendingNowCollection(srf=srf)
-    top_100 = Top100Collection(srf=srf)
-    night_out = NightOutCollection(srf=srf)
-
-    for collection in [trending_now, top_100, night_out]:
-        new_songs = collection.get_new_songs()
-        if new_songs:
-            collection.playlist.add_songs(new_songs)
-
-        old_songs = collection.get_old_songs()
-        if old_songs:
-            collection.playlist.remove_songs(old_songs)
-
-        time.sleep(1)
+def main(*, use_async: bool = False):
+    with tick_lock() as acquired:
+        if not acquired:
+            logger.warning("skipping run, another tick is still running")
+            return
+
+        # rebuild everything on every run
+        app = create_app(use_async=use_async)
+        try:
+            app.tick()
+        finally:
+            app.close()
+
+
+def rebuild() -> None:
+    from srfvirus_spotify.app import App
+
+    with tick_lock() as acquired:
+        if not acquired:
+            logger.warning("another tick is still running, try again later")
+            return
+
+        app = App()
+        try:
+            app.rebuild()
+        finally:
+            app.close()
+
+
+def reconcile() -> None:
+    from srfvirus_spotify.app import App
+
+    with tick_lock() as acquired:
+        if not acquired:
+            logger.warning("another tick is still running, try again later")
+            return
+
+        app = App()
+        try:
+            app.reconcile(force=True)
+            app.drain()
+        finally:
+            app.close()
+
+
+def list_channels() -> None:
+    from srfvirus_spotify.app import App
+
+    with tick_lock() as acquired:
+        if not acquired:
+            logger.warning("another tick is still running, try again later")
+            return
+
+        app = App()
+        try:
+            for channel in app.srf.list_channels():
+                print(f"{channel['id']}  {channel['title']}")
+        finally:
+            app.close()
+
+
+def run(*, daemon: bool, use_async: bool) -> None:
+    if not daemon:
+        from apscheduler.schedulers.blocking import BlockingScheduler
+
+        scheduler = BlockingScheduler()
+        now = datetime.datetime.now()
+        scheduler.add_job(
+            main,
+            "interval",
+            minutes=15,
+            next_run_time=now,
+            kwargs={"use_async": use_async},
+            max_instances=1,
+            coalesce=True,
+        )
+        scheduler.start()
+        return
+
+    # keep clients, tokens and song state warm across runs, polled as often as new songs show up
+    app = create_app(use_async=use_async)
+    try:
+        PollScheduler(app).run()
+    finally:
+        app.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--daemon", action="store_true", help="build clients and state once and reuse them")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="run each tick on asyncio")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the playlists from the play log")
+    parser.add_argument("--reconcile", action="store_true", help="correct drift of the playlists on Spotify")
+    parser.add_argument("--channels", action="store_true", help="list the ids of the SRF radio channels")
+    args = parser.parse_args()
+
     setup()
-    scheduler.start()
+    if args.channels:
+        list_channels()
+    elif args.rebuild:
+        rebuild()
+    elif args.reconcile:
+        reconcile()
+    else:
+        run(daemon=args.daemon, use_async=args.use_async)
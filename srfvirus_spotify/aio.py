@@ -0,0 +1,376 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from spotipy import SpotifyException
+
+from . import tracing
+from .app import App
+from .env import Env
+from .metrics import metrics
+
+from .errors import SRFHTTPException
+from .rate_limiter import RateLimiter
+from .song import Play
+from .spotify import ADD, REMOVE, Spotify, SpotifyPlaylist, get_retry_delay
+from .srf import SRF_AUDIO_BASE_URL, _SRFClient
+from .token_manager import TokenManager
+
+
+logger = logging.getLogger(__name__)
+
+
+SPOTIFY_API_BASE_URL = Env.SPOTIFY_API_BASE_URL
+
+
+class AsyncSRFClient:
+
+    def __init__(self, *, session: aiohttp.ClientSession, client: _SRFClient):
+        self.session: aiohttp.ClientSession = session
+        # shares the token and the cached songlists with the synchronous client
+        self.client: _SRFClient = client
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        # returns the data, None if not modified, and the ETag
+        headers = {
+            "Accept": "application/json",
+            "Authorization": f"Bearer {self.client.token_manager.access_token}",
+            **(headers or {}),
+        }
+
+        attempt = 0
+        while True:
+            try:
+                async with self.session.request(
+                    method, f"{SRF_AUDIO_BASE_URL}{url}", headers=headers, params=params
+                ) as response:
+                    if response.status == 304:
+                        return None, response.headers.get("ETag")
+
+                    if response.status < 500 or attempt >= _SRFClient.MAX_RETRIES:
+                        data = await response.json(content_type=None)
+                        if 300 > response.status >= 200:
+                            return data, response.headers.get("ETag")
+                        else:
+                            raise SRFHTTPException(response=response, data=data)
+
+                    logger.warning(f"{method} {url} returned {response.status}, retrying")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= _SRFClient.MAX_RETRIES:
+                    raise
+                logger.warning(f"{method} {url} failed ({e.__class__.__name__}), retrying")
+
+            await asyncio.sleep(_SRFClient.get_backoff_delay(attempt))
+            attempt += 1
+
+    async def fetch_song_list(self, channel_id: str) -> List[Dict[str, Any]]:
+        params = {"bu": "srf", "channelId": channel_id}
+        headers = self.client.get_song_list_headers(channel_id)
+        data, etag = await self._request("GET", "/radio/songlist", params=params, headers=headers)
+        if data is None and channel_id in self.client.song_lists:
+            return self.client.get_cached_song_list(channel_id)
+
+        songs = data["songList"] if data is not None else []
+        self.client.set_cached_song_list(channel_id, etag, songs)
+        return songs
+
+
+class AsyncSpotifyClient:
+
+    def __init__(
+        self,
+        *,
+        session: aiohttp.ClientSession,
+        token_manager: TokenManager,
+        rate_limiter: RateLimiter,
+    ):
+        self.session: aiohttp.ClientSession = session
+        self.token_manager: TokenManager = token_manager
+        self.rate_limiter: RateLimiter = rate_limiter
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        idempotent: bool = True,
+    ) -> Optional[Dict[str, Any]]:
+        attempt = 1
+        while True:
+            await self.rate_limiter.acquire_async()
+
+            headers = {"Authorization": f"Bearer {self.token_manager.access_token}"}
+            async with self.session.request(
+                method, f"{SPOTIFY_API_BASE_URL}{url}", headers=headers, params=params, json=payload
+            ) as response:
+                if 300 > response.status >= 200:
+                    self.rate_limiter.reward()
+                    if response.content_length == 0:
+                        return None
+                    return await response.json(content_type=None)
+
+                # same exception as spotipy, so errors look the same in both modes
+                error = SpotifyException(
+                    response.status,
+                    -1,
+                    f"{response.url}:\n {await response.text()}",
+                    reason=response.reason,
+                    headers=dict(response.headers),
+                )
+
+            delay = get_retry_delay(error, attempt)
+            # a server error may have been applied anyway, only a rejected 429 is safe to repeat then
+            if delay is None or (not idempotent and error.http_status != 429):
+                raise error
+
+            metrics.inc("spotify_retries", status=error.http_status)
+            if error.http_status == 429:
+                self.rate_limiter.penalize(delay)
+            else:
+                # an outage says nothing about the rate, so only this call backs off
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    async def search(self, q: str) -> Optional[Dict[str, Any]]:
+        params = {"q": q, "limit": 10, "offset": 0, "type": "track"}
+        return await self._request("GET", "/search", params=params)
+
+    async def playlist_add_items(self, playlist_id: str, items: List[str]) -> Optional[Dict[str, Any]]:
+        payload = {"uris": items}
+        url = f"/playlists/{playlist_id}/items"
+        return await self._request("POST", url, payload=payload, idempotent=False)
+
+    async def playlist_remove_all_occurrences_of_items(
+        self, playlist_id: str, items: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        payload = {"items": [{"uri": uri} for uri in items]}
+        return await self._request("DELETE", f"/playlists/{playlist_id}/items", payload=payload)
+
+
+class AsyncApp:
+
+    RESOLVE_WORKERS = 4
+    TIMEOUT = aiohttp.ClientTimeout(sock_connect=_SRFClient.TIMEOUT[0], sock_read=_SRFClient.TIMEOUT[1])
+
+    def __init__(self):
+        # tokens, storage and the collection rules are shared with the synchronous app
+        self.app: App = App()
+        self._loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self._session: Optional[aiohttp.ClientSession] = None
+        # searches in flight by cache key, so channels playing the same song search it only once
+        self._searches: Dict[str, asyncio.Future[Optional[str]]] = {}
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=self.TIMEOUT)
+        return self._session
+
+    async def _resolve_song(
+        self,
+        spotify_client: AsyncSpotifyClient,
+        raw_song: Dict[str, Any],
+    ) -> Optional[str]:
+        title = raw_song["title"]
+        artist = raw_song["artist"]["name"]
+
+        cache = self.app.srf.spotify.resolution_cache
+        cached, uri = cache.get(title=title, artist=artist)
+        if cached:
+            return uri
+
+        key = cache.encode_key(title=title, artist=artist)
+        search = self._searches.get(key)
+        if search is None:
+            search = asyncio.ensure_future(self._search_title(spotify_client, title=title, artist=artist))
+            self._searches[key] = search
+            search.add_done_callback(lambda _: self._searches.pop(key, None))
+        return await search
+
+    async def _search_title(
+        self,
+        spotify_client: AsyncSpotifyClient,
+        *,
+        title: str,
+        artist: str,
+    ) -> Optional[str]:
+        q = Spotify.build_search_query(title=title, artist=artist)
+        with metrics.timer("spotify_search"):
+            search_results = await spotify_client.search(q)
+        uri = Spotify.parse_search_results(search_results)
+        self.app.srf.spotify.resolution_cache.set(title=title, artist=artist, uri=uri)
+        return uri
+
+    async def _get_current_plays(
+        self,
+        srf_client: AsyncSRFClient,
+        spotify_client: AsyncSpotifyClient,
+        channel_id: str,
+    ) -> Optional[List[Play]]:
+        # returns None if there is a gap to the last processed song which needs a backfill
+        srf = self.app.srf
+        last_timestamp = srf.get_last_timestamp(channel_id)
+        has_gap = False
+
+        raw_songs: List[Tuple[Dict[str, Any], int]] = []
+        # filled in by index as the songs are resolved
+        uris: List[Optional[str]] = []
+        queue: asyncio.Queue[Optional[Tuple[int, Dict[str, Any]]]] = asyncio.Queue()
+
+        async def fetch() -> None:
+            nonlocal has_gap
+            try:
+                data = await srf_client.fetch_song_list(channel_id)
+                srf.update_next_song_at(channel_id, data)
+                has_gap = srf.has_gap(data, last_timestamp)
+                if has_gap:
+                    return
+
+                for raw_song in data:
+                    # songs are resolved while the rest of the list is still processed
+                    played_at = srf.get_played_at(raw_song)
+                    if played_at == last_timestamp:
+                        break
+
+                    queue.put_nowait((len(raw_songs), raw_song))
+                    raw_songs.append((raw_song, played_at))
+                    uris.append(None)
+            finally:
+                for _ in range(self.RESOLVE_WORKERS):
+                    queue.put_nowait(None)
+
+        async def resolve() -> None:
+            while (item := await queue.get()) is not None:
+                i, raw_song = item
+                uris[i] = await self._resolve_song(spotify_client, raw_song)
+
+        await asyncio.gather(fetch(), *[resolve() for _ in range(self.RESOLVE_WORKERS)])
+        if has_gap:
+            return None
+
+        # saves the resolution cache and appends to the play log, which would block the loop
+        return await asyncio.to_thread(srf.build_current_plays, channel_id, raw_songs, uris)
+
+    async def _send(
+        self,
+        spotify_client: AsyncSpotifyClient,
+        playlist: SpotifyPlaylist,
+        op: str,
+        items: List[str],
+    ) -> None:
+        with metrics.timer("spotify_playlist_mutation", playlist=playlist.name, op=op):
+            if op == ADD:
+                await spotify_client.playlist_add_items(playlist.id, items)
+            else:
+                await spotify_client.playlist_remove_all_occurrences_of_items(playlist.id, items)
+
+        if op == ADD:
+            playlist.mark_added(items)
+        else:
+            playlist.mark_removed(items)
+
+    async def _drain_playlist(self, spotify_client: AsyncSpotifyClient, playlist: SpotifyPlaylist) -> None:
+        outbox = self.app.outbox
+        try:
+            for op, chunk, retried in outbox.iter_chunks(playlist):
+                outbox.mark_attempted(playlist, chunk)
+                self.app.mirror.invalidate(playlist)
+                if retried:
+                    await self._send(spotify_client, playlist, REMOVE, retried)
+                await self._send(spotify_client, playlist, op, chunk)
+                outbox.complete(playlist, chunk)
+        except Exception:
+            # everything not sent stays in the outbox for the next tick
+            logger.exception(f"failed to update playlist '{playlist.name}', retry on next tick")
+
+    async def _drain(self, spotify_client: AsyncSpotifyClient) -> None:
+        if len(self.app.outbox):
+            with metrics.timer("outbox_drain"):
+                playlists = [collection.playlist for collection in self.app.collections]
+                await asyncio.gather(
+                    *[self._drain_playlist(spotify_client, playlist) for playlist in playlists]
+                )
+            self.app.mirror.save()
+
+    async def _tick(self) -> None:
+        session = await self._get_session()
+        srf_client = AsyncSRFClient(session=session, client=self.app.srf.client)
+        spotify_client = AsyncSpotifyClient(
+            session=session,
+            token_manager=self.app.srf.spotify.token_manager,
+            rate_limiter=self.app.srf.spotify.rate_limiter,
+        )
+
+        # leftovers of the previous tick go first
+        await self._drain(spotify_client)
+        self.app.catch_up()
+        channel_ids = self.app.channel_ids
+        results = await asyncio.gather(
+            *[self._get_current_plays(srf_client, spotify_client, channel_id) for channel_id in channel_ids]
+        )
+
+        for channel_id, plays in zip(channel_ids, results):
+            if plays is None:
+                # catching up after downtime is rare, it runs through the synchronous pipeline
+                last_timestamp = self.app.srf.get_last_timestamp(channel_id)
+                for plays in self.app.srf.iter_backfill(channel_id, last_timestamp):  # type: ignore
+                    self.app.process(plays, channel_id=channel_id)
+                continue
+
+            # storage commits right away, the playlists follow through the outbox
+            self.app.process(plays, channel_id=channel_id)
+
+        await self._drain(spotify_client)
+        # runs at most once an hour per playlist, so it uses the synchronous client
+        self.app.reconcile()
+        await self._drain(spotify_client)
+
+    def tick(self) -> None:
+        with tracing.start_transaction(op="tick", name="tick"), metrics.timer("tick"):
+            self._loop.run_until_complete(self._tick())
+
+        metrics.write(Env.METRICS_PATH)
+
+    def get_poll_delay(self, now: float) -> float:
+        return self.app.get_poll_delay(now)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._loop.run_until_complete(self._session.close())
+        self._loop.close()
+        self.app.close()
@@ -0,0 +1,322 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from queue import Full, Queue
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import tracing
+from .env import Env
+from .metrics import metrics
+from .outbox import PlaylistOutbox
+from .playlist_mirror import PlaylistMirror
+from .song import Play, Song
+from .rules import RULES, match_plays
+from .srf import SRF, SRF_VIRUS_CHANNEL_ID, SongCollection
+
+
+logger = logging.getLogger(__name__)
+
+
+def replay(
+    collection: SongCollection,
+    plays: List[Play],
+    *,
+    window: int,
+) -> Iterator[Tuple[int, List[Song], List[Song]]]:
+    # applies plays oldest first in windows like the regular ticks, on a virtual clock at the window end
+    try:
+        for number, group in groupby(plays, key=lambda play: play.played_at // window):
+            now = (number + 1) * window
+            collection.clock = lambda: now
+            # newest first like the songlist
+            collection.current_plays = match_plays([collection.rule], list(group)[::-1])[0]
+            if not collection.is_idle():
+                yield now, collection.get_new_songs(), collection.get_old_songs()
+    finally:
+        collection.clock = time.time
+
+
+class App:
+
+    # plays are replayed in windows like the regular ticks
+    REPLAY_WINDOW = int(datetime.timedelta(minutes=15).total_seconds())
+    CHANNEL_WORKERS = 4
+    # playlists are compared against Spotify at most this often
+    RECONCILE_INTERVAL = int(datetime.timedelta(hours=1).total_seconds())
+    # the poll delay adapts to the songs within these bounds, the default applies without any plays yet
+    POLL_DELAY = int(datetime.timedelta(minutes=15).total_seconds())
+    MIN_POLL_DELAY = int(datetime.timedelta(minutes=1).total_seconds())
+    MAX_POLL_DELAY = int(datetime.timedelta(minutes=30).total_seconds())
+    # new songs per poll, a single one while a rule with a time filter collects plays
+    SONGS_PER_POLL = 4
+    # a song shows up in the songlist shortly after it started
+    POLL_GRACE = 30
+
+    def __init__(self):
+        self.srf: SRF = SRF()
+        self.collections: List[SongCollection] = [SongCollection(srf=self.srf, rule=rule) for rule in RULES]
+        # channels in the order of the rules, each one is polled once per tick
+        self.channel_ids: List[str] = list(dict.fromkeys(rule.channel_id for rule in RULES))
+        # playlist mutations which are committed to storage but not yet sent to Spotify
+        self.outbox: PlaylistOutbox = PlaylistOutbox("./storage/playlist_outbox.json")
+        for collection in self.collections:
+            self.outbox.restore_known_uris(collection.playlist)
+        # last known content of the playlists on Spotify
+        self.mirror: PlaylistMirror = PlaylistMirror("./storage/playlist_mirror.json")
+        if Env.METRICS_PORT is not None:
+            metrics.serve(Env.METRICS_PORT)
+
+    def get_collections(self, channel_id: str) -> List[SongCollection]:
+        return [collection for collection in self.collections if collection.rule.channel_id == channel_id]
+
+    def dispatch(self, plays: List[Play], *, channel_id: str = SRF_VIRUS_CHANNEL_ID) -> List[SongCollection]:
+        # hands each collection its plays in one pass, returns the collections which have work to do
+        self.srf.current_plays = plays
+
+        active = []
+        idle = []
+        collections = self.get_collections(channel_id)
+        matched = match_plays([collection.rule for collection in collections], plays)
+        for collection, collection_plays in zip(collections, matched):
+            collection.update(collection_plays)
+            if collection.is_idle():
+                idle.append(collection)
+            else:
+                active.append(collection)
+
+        if plays and idle:
+            # idle collections have nothing to commit, so their position moves on in a single write
+            with self.srf.metadata.lock():
+                positions = self.srf.metadata.get("log_positions") or {}
+                for collection in idle:
+                    positions[collection.name] = max(positions.get(collection.name) or 0, plays[0].played_at)
+                self.srf.metadata.set("log_positions", positions)
+
+        return active
+
+    def process(self, plays: List[Play], *, channel_id: str = SRF_VIRUS_CHANNEL_ID) -> None:
+        for collection in self.dispatch(plays, channel_id=channel_id):
+            name = collection.name
+            with collection.transaction():
+                with metrics.timer("collection_stage", collection=name, stage="get_new_songs"):
+                    new_songs = collection.get_new_songs()
+                with metrics.timer("collection_stage", collection=name, stage="get_old_songs"):
+                    old_songs = collection.get_old_songs()
+                if new_songs or old_songs:
+                    self.outbox.mark_committing(collection.playlist)
+
+            # queued only once the storage committed, so a rollback never leaves changes behind
+            if new_songs or old_songs:
+                with self.outbox.transaction():
+                    self.outbox.enqueue(collection.playlist, add=new_songs, remove=old_songs)
+                    self.outbox.clear_committing(collection.playlist)
+
+    def drain(self) -> None:
+        # one batch per playlist for all collections, whatever fails is retried on the next tick
+        if len(self.outbox):
+            with metrics.timer("outbox_drain"):
+                self.outbox.drain([collection.playlist for collection in self.collections], self.mirror)
+            self.mirror.save()
+
+    def reconcile(self, *, force: bool = False) -> None:
+        # corrects drift from manual edits or lost mutations, only queues the corrections
+        now = int(time.time())
+        for collection in self.collections:
+            playlist = collection.playlist
+            # changes of an interrupted run might have been committed without being queued
+            due = force or self.outbox.is_committing(playlist)
+            if not due and not self.mirror.is_due(playlist, now=now, interval=self.RECONCILE_INTERVAL):
+                continue
+            if self.outbox.get_pending(playlist):
+                # still changing, compared once the outbox is drained
+                continue
+
+            try:
+                actual = self.mirror.refresh(playlist)
+            except Exception:
+                logger.exception(f"failed to fetch playlist '{playlist.name}', retry on next tick")
+                continue
+
+            expected = collection.songs.get_in_playlist_uris()
+            actual_uris = set(actual)
+            expected_uris = set(expected)
+            add = [uri for uri in expected if uri not in actual_uris]
+            remove = [uri for uri in dict.fromkeys(actual) if uri not in expected_uris]
+
+            playlist.set_known_uris(actual_uris)
+            if add or remove:
+                logger.warning(
+                    f"playlist '{playlist.name}' lacks {len(add)} and has {len(remove)} extra items"
+                )
+                metrics.inc("playlist_drift", len(add) + len(remove), playlist=playlist.name)
+            if add or remove or self.outbox.is_committing(playlist):
+                with self.outbox.transaction():
+                    self.outbox.enqueue_uris(playlist, add=add, remove=remove)
+                    self.outbox.clear_committing(playlist)
+            self.mirror.mark_reconciled(playlist, now)
+
+    def catch_up(self) -> None:
+        for channel_id in self.channel_ids:
+            self._catch_up_channel(channel_id)
+
+    def _catch_up_channel(self, channel_id: str) -> None:
+        # apply plays which were logged but not applied before an interruption
+        play_log = self.srf.get_play_log(channel_id)
+        last_played_at = play_log.last_played_at
+        if last_played_at is None:
+            return
+
+        positions = []
+        for collection in self.get_collections(channel_id):
+            if collection.log_position is None:
+                # state from before the play log already contains all logged plays
+                collection.log_position = last_played_at
+            positions.append(collection.log_position)
+
+        since = min(positions)
+        if since >= last_played_at:
+            return
+
+        plays = list(play_log.iter_plays(since=since))
+        logger.info(f"apply {len(plays)} plays of {channel_id} from the play log")
+        # collections skip plays they already applied
+        self.process(plays[::-1], channel_id=channel_id)
+
+    def rebuild(self, names: Optional[List[str]] = None) -> None:
+        plays: Dict[str, List[Play]] = {}
+        for collection in self.collections:
+            if names is None or collection.name in names:
+                channel_id = collection.rule.channel_id
+                if channel_id not in plays:
+                    plays[channel_id] = list(self.srf.get_play_log(channel_id).iter_plays())
+
+                logger.info(f"rebuild '{collection.name}' from {len(plays[channel_id])} plays")
+                with metrics.timer("rebuild", collection=collection.name):
+                    self._rebuild_collection(collection, plays[channel_id])
+
+    def _rebuild_collection(self, collection: SongCollection, plays: List[Play]) -> None:
+        old_songs = [song for song in collection.songs.get_all() if song.in_playlist]
+
+        self.outbox.mark_committing(collection.playlist)
+        with collection.transaction():
+            collection.reset()
+            for _ in replay(collection, plays, window=self.REPLAY_WINDOW):
+                pass
+
+            # expire what is too old by now
+            collection.get_old_songs()
+
+        if plays:
+            collection.log_position = plays[-1].played_at
+            collection.expiry.save(collection.log_position)
+
+        new_songs = [song for song in collection.songs.get_all() if song.in_playlist]
+        new_uris = {song.uri for song in new_songs}
+        with self.outbox.transaction():
+            self.outbox.enqueue(
+                collection.playlist,
+                add=new_songs,
+                remove=[song for song in old_songs if song.uri not in new_uris],
+            )
+            self.outbox.clear_committing(collection.playlist)
+        self.drain()
+
+    def get_poll_delay(self, now: float) -> float:
+        return min(self._get_channel_poll_delay(channel_id, now) for channel_id in self.channel_ids)
+
+    def _get_channel_poll_delay(self, channel_id: str, now: float) -> float:
+        play_log = self.srf.get_play_log(channel_id)
+        interval = play_log.get_play_interval()
+        if interval is None:
+            return self.POLL_DELAY
+
+        songs = self.SONGS_PER_POLL
+        rules = [collection.rule for collection in self.get_collections(channel_id)]
+        if any(rule.has_time_filter and rule.is_active(now) for rule in rules):
+            songs = 1
+
+        next_song_at = self.srf.next_song_at.get(channel_id)
+        if next_song_at is None:
+            next_song_at = (play_log.last_played_at or now) + interval
+        # an overdue song may show up any moment
+        poll_at = max(next_song_at, now) + (songs - 1) * interval + self.POLL_GRACE
+        return min(max(poll_at - now, self.MIN_POLL_DELAY), self.MAX_POLL_DELAY)
+
+    def _fetch_channel(self, channel_id: str, batches: Queue, stopped: threading.Event) -> None:
+        # hands over one batch at a time, so a long backfill is never held in memory as a whole
+        item: Optional[BaseException] = None
+        try:
+            for plays in self.srf.iter_current_plays(channel_id):
+                if not self._put_batch(batches, plays, stopped):
+                    return
+        except BaseException as e:
+            item = e
+        self._put_batch(batches, item, stopped)
+
+    def _put_batch(self, batches: Queue, item: Any, stopped: threading.Event) -> bool:
+        # gives up once the tick stopped consuming, e.g. after an error in another channel
+        while not stopped.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def tick(self) -> None:
+        with tracing.start_transaction(op="tick", name="tick"), metrics.timer("tick"):
+            # leftovers of the previous tick go first
+            self.drain()
+            self.catch_up()
+            # channels are fetched and resolved in parallel, their plays are applied one channel at a time
+            stopped = threading.Event()
+            # a fetch runs at most one batch ahead of processing
+            queues: Dict[str, Queue] = {channel_id: Queue(maxsize=1) for channel_id in self.channel_ids}
+            with ThreadPoolExecutor(max_workers=self.CHANNEL_WORKERS) as executor:
+                for channel_id in self.channel_ids:
+                    executor.submit(self._fetch_channel, channel_id, queues[channel_id], stopped)
+                try:
+                    for channel_id in self.channel_ids:
+                        # more than one batch only when catching up after downtime
+                        while (item := queues[channel_id].get()) is not None:
+                            if isinstance(item, BaseException):
+                                raise item
+                            self.process(item, channel_id=channel_id)
+                finally:
+                    stopped.set()
+            self.drain()
+            self.reconcile()
+            self.drain()
+
+        metrics.write(Env.METRICS_PATH)
+
+    def close(self) -> None:
+        metrics.close()
+        self.srf.close()
@@ -23,11 +23,16 @@ SOFTWARE.
 """
 
 import logging
-from typing import Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
 
 from spotipy import CacheHandler
 
 from .json_file import JSONFile
+from .metrics import metrics
+from .storage_handler import SONG_ENCODE_FORMAT
 
 
 logger = logging.getLogger(__name__)
@@ -36,13 +41,129 @@ logger = logging.getLogger(__name__)
 class TokenCacheFileHandler(CacheHandler):
     def __init__(self, cache_path: str):
         self.json_file: JSONFile = JSONFile(cache_path)
+        # the file is only read once and written on changes
+        self._token_info: Optional[Dict[str, Any]] = None
 
     def get_cached_token(self) -> Dict[str, Any]:
-        token_info = self.json_file.read()
-        if token_info is None:
-            raise ValueError("token_info could not be retrieved")
+        if self._token_info is None:
+            token_info = self.json_file.read()
+            if token_info is None:
+                raise ValueError("token_info could not be retrieved")
+            self._token_info = token_info
 
-        return token_info
+        return self._token_info
 
     def save_token_to_cache(self, token_info: Dict[str, Any]) -> None:
+        if token_info == self._token_info:
+            return
+
+        self._token_info = token_info
         self.json_file.write(token_info)
+
+
+class SongResolutionCacheHandler:
+
+    # misses (songs Spotify doesn't have) are cached as well, but expire
+    # sooner than hits so songs released later are still picked up
+    HIT_TTL = 60 * 60 * 24 * 30
+    MISS_TTL = 60 * 60 * 24
+    MAX_ENTRIES = 5000
+    # hits only move an entry in memory, its stored used_at is refreshed at most this often
+    USED_AT_INTERVAL = 60 * 60 * 24
+
+    def __init__(
+        self,
+        cache_path: str,
+        *,
+        hit_ttl: int = HIT_TTL,
+        miss_ttl: int = MISS_TTL,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        self.json_file: JSONFile = JSONFile(cache_path)
+        self.hit_ttl: int = hit_ttl
+        self.miss_ttl: int = miss_ttl
+        self.max_entries: int = max_entries
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._entries: Dict[str, Dict[str, Any]] = self.json_file.read()
+        # keys from least to most recently used
+        self._lru: OrderedDict[str, None] = OrderedDict.fromkeys(
+            sorted(self._entries, key=lambda k: self._entries[k]["used_at"])
+        )
+        self._dirty: bool = False
+        self._lock: threading.Lock = threading.Lock()
+        # saves from several channels are written one after another
+        self._write_lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def encode_key(*, title: str, artist: str) -> str:
+        title = " ".join(title.casefold().split())
+        artist = " ".join(artist.casefold().split())
+        return SONG_ENCODE_FORMAT.format(title=title, artist=artist)
+
+    def _is_expired(self, entry: Dict[str, Any], now: int) -> bool:
+        ttl = self.hit_ttl if entry["uri"] is not None else self.miss_ttl
+        return now >= (entry["resolved_at"] + ttl)
+
+    def get(self, *, title: str, artist: str) -> Tuple[bool, Optional[str]]:
+        # returns whether the song is cached and its uri (None for cached misses)
+        key = self.encode_key(title=title, artist=artist)
+        now = int(time.time())
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._is_expired(entry, now):
+                self.misses += 1
+                metrics.inc("resolution_cache_lookups", result="miss")
+                return False, None
+
+            self.hits += 1
+            metrics.inc("resolution_cache_lookups", result="hit")
+            self._lru.move_to_end(key)
+            if now - entry["used_at"] >= self.USED_AT_INTERVAL:
+                entry["used_at"] = now
+                self._dirty = True
+            return True, entry["uri"]
+
+    def set(self, *, title: str, artist: str, uri: Optional[str]) -> None:
+        key = self.encode_key(title=title, artist=artist)
+        now = int(time.time())
+        with self._lock:
+            self._entries[key] = {"uri": uri, "resolved_at": now, "used_at": now}
+            self._lru[key] = None
+            self._lru.move_to_end(key)
+            self._dirty = True
+
+    def _evict(self) -> None:
+        now = int(time.time())
+        expired = [key for key, entry in self._entries.items() if self._is_expired(entry, now)]
+        for key in expired:
+            del self._entries[key]
+            del self._lru[key]
+
+        # drop least recently used entries beyond the size limit
+        overflow = len(self._entries) - self.max_entries
+        for _ in range(overflow):
+            key, _ = self._lru.popitem(last=False)
+            del self._entries[key]
+
+        if expired or overflow > 0:
+            self._dirty = True
+
+    def save(self) -> None:
+        # a copy is written outside the lock, so lookups from other threads or the event loop don't wait
+        with self._write_lock:
+            with self._lock:
+                self._evict()
+                if not self._dirty:
+                    return
+                entries = dict(self._entries)
+                self._dirty = False
+
+            try:
+                self.json_file.write(entries)
+            except BaseException:
+                self._dirty = True
+                raise
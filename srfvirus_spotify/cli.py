@@ -0,0 +1,141 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, Union
+
+from .scheduler import tick_lock
+
+# everything heavy is imported once it's needed, a one-shot run pays only for what it uses
+if TYPE_CHECKING:
+    from .aio import AsyncApp
+    from .app import App
+
+
+logger = logging.getLogger(__name__)
+
+
+def setup() -> None:
+    from . import tracing
+    from .env import Env
+
+    tracing.init(
+        dsn=Env.SENTRY_DSN,
+        ignore_errors=[KeyboardInterrupt],
+        traces_sample_rate=Env.SENTRY_TRACES_SAMPLE_RATE,
+    )
+
+    log_path = "./logs/logging.log"
+    if not os.path.exists(log_path):
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+    logging.basicConfig(
+        format="%(asctime)s %(name)s %(levelname)s %(message)s",
+        datefmt="%d.%m.%y %H:%M:%S %Z",
+        level=logging.INFO,
+        handlers=[logging.FileHandler(log_path), logging.StreamHandler()],
+    )
+
+
+def create_app(*, use_async: bool) -> Union[App, AsyncApp]:
+    if use_async:
+        from .aio import AsyncApp
+
+        return AsyncApp()
+    else:
+        from .app import App
+
+        return App()
+
+
+class Timings:
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.modules: Dict[str, int] = {}
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        modules = len(sys.modules)
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = time.perf_counter() - started_at
+            self.modules[phase] = len(sys.modules) - modules
+
+    def report(self) -> str:
+        lines = []
+        for phase, seconds in self.phases.items():
+            lines.append(f"{phase:<8} {seconds:8.3f}s {self.modules[phase]:5d} modules")
+        lines.append(f"{'total':<8} {sum(self.phases.values()):8.3f}s {len(sys.modules):5d} modules")
+        return "\n".join(lines)
+
+
+def run_once(*, use_async: bool, timings: Timings) -> None:
+    with timings.measure("setup"):
+        setup()
+
+    with tick_lock() as acquired:
+        if not acquired:
+            logger.warning("skipping run, another tick is still running")
+            return
+        _run_tick(use_async=use_async, timings=timings)
+
+
+def _run_tick(*, use_async: bool, timings: Timings) -> None:
+    with timings.measure("import"):
+        importlib.import_module(".aio" if use_async else ".app", __package__)
+    with timings.measure("init"):
+        tick_app = create_app(use_async=use_async)
+    try:
+        with timings.measure("tick"):
+            tick_app.tick()
+    finally:
+        with timings.measure("close"):
+            tick_app.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m srfvirus_spotify")
+    commands = parser.add_subparsers(dest="command", required=True)
+    one_shot = commands.add_parser("run-once", help="run a single tick and exit, e.g. from cron")
+    one_shot.add_argument("--async", dest="use_async", action="store_true", help="run the tick on asyncio")
+    one_shot.add_argument("--timings", action="store_true", help="report startup and tick durations")
+    args = parser.parse_args()
+
+    timings = Timings()
+    try:
+        run_once(use_async=args.use_async, timings=timings)
+    finally:
+        if args.timings:
+            sys.stderr.write(timings.report() + "\n")
@@ -23,6 +23,7 @@ SOFTWARE.
 """
 
 import os
+from typing import Optional
 
 from dotenv import load_dotenv
 
@@ -40,3 +41,15 @@ class Env:
     SRF_CLIENT_ID: str = os.getenv("SRF_CLIENT_ID")  # type: ignore
     SRF_CLIENT_SECRET: str = os.getenv("SRF_CLIENT_SECRET")  # type: ignore
     SENTRY_DSN: str = os.getenv("SENTRY_DSN")  # type: ignore
+
+    # only overridden to run against local stand-in servers
+    SRF_BASE_URL: str = os.getenv("SRF_BASE_URL", "https://api.srgssr.ch")
+    SPOTIFY_API_BASE_URL: str = os.getenv("SPOTIFY_API_BASE_URL", "https://api.spotify.com/v1")
+
+    # written after every run, optionally also served on localhost
+    METRICS_PATH: str = os.getenv("METRICS_PATH", "./metrics/srfvirus_spotify.prom")
+    METRICS_PORT: Optional[int] = int(os.environ["METRICS_PORT"]) if os.getenv("METRICS_PORT") else None
+    SENTRY_TRACES_SAMPLE_RATE: float = float(os.getenv("SENTRY_TRACES_SAMPLE_RATE", "0"))
+
+    # either "json" or "sqlite"
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "json")
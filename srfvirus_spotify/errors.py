@@ -24,16 +24,17 @@ SOFTWARE.
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, Union
 
 if TYPE_CHECKING:
     from requests import Response
+    from aiohttp import ClientResponse
 
 
-class SRFHTTPException(BaseException):
+class SRFHTTPException(Exception):
 
-    def __init__(self, response: Response, data: Dict[str, Any]):
-        self.response: Response = response
+    def __init__(self, response: Union[Response, ClientResponse], data: Dict[str, Any]):
+        self.response: Union[Response, ClientResponse] = response
         self.reason: Optional[str] = self.response.reason
         self.data: Dict[str, Any] = data
         super().__init__(f"{self.data}")
@@ -0,0 +1,106 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import heapq
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .json_file import JSONFile
+from .song import Song
+
+
+logger = logging.getLogger(__name__)
+
+
+ExpiryEntry = Tuple[int, str]
+
+
+class ExpiryIndex:
+
+    def __init__(self, path: str, *, deadline: int):
+        self.json_file: JSONFile = JSONFile(path)
+        self.deadline: int = deadline
+
+        data = self.json_file.read()
+        # log position of the collection when the index was saved, to detect an outdated index
+        self.position: Optional[int] = data.get("position")
+        # expiry per song in the playlist, the heap may hold outdated entries which are skipped on pop
+        self._expires_at: Dict[str, int] = {}
+        self._heap: List[ExpiryEntry] = []
+        if data.get("deadline") == self.deadline:
+            self._expires_at = {uri: expires_at for expires_at, uri in data.get("entries", [])}
+            self._heapify()
+
+    def __len__(self) -> int:
+        return len(self._expires_at)
+
+    def __contains__(self, uri: str) -> bool:
+        return uri in self._expires_at
+
+    def _heapify(self) -> None:
+        self._heap = [(expires_at, uri) for uri, expires_at in self._expires_at.items()]
+        heapq.heapify(self._heap)
+
+    def rebuild(self, songs: Iterable[Song]) -> None:
+        self._expires_at = {song.uri: song.retained_at + self.deadline for song in songs if song.in_playlist}
+        self._heapify()
+
+    def clear(self) -> None:
+        self._expires_at = {}
+        self._heap = []
+
+    def update(self, song: Song) -> None:
+        # only songs in the playlist can expire
+        if not song.in_playlist:
+            self.discard(song.uri)
+            return
+
+        expires_at = song.retained_at + self.deadline
+        if self._expires_at.get(song.uri) != expires_at:
+            self._expires_at[song.uri] = expires_at
+            heapq.heappush(self._heap, (expires_at, song.uri))
+            # drop outdated entries once they outweigh the valid ones
+            if len(self._heap) > 2 * len(self._expires_at) + 64:
+                self._heapify()
+
+    def discard(self, uri: str) -> None:
+        self._expires_at.pop(uri, None)
+
+    def is_due(self, now: int) -> bool:
+        # may be a false positive because of an outdated entry
+        return bool(self._heap) and self._heap[0][0] <= now
+
+    def pop_due(self, now: int) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, uri = heapq.heappop(self._heap)
+            if self._expires_at.get(uri) == expires_at:
+                del self._expires_at[uri]
+                due.append(uri)
+        return due
+
+    def save(self, position: Optional[int]) -> None:
+        self.position = position
+        entries = sorted((expires_at, uri) for uri, expires_at in self._expires_at.items())
+        self.json_file.write({"deadline": self.deadline, "position": position, "entries": entries})
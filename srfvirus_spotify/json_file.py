@@ -25,11 +25,20 @@ SOFTWARE.
 import json
 import os
 import logging
-from typing import Any, Dict, Optional, TextIO
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Iterator, Tuple
+
+from .metrics import metrics
 
 
 logger = logging.getLogger(__name__)
 
+# mode for new files, temp files are created with 0600 and get the mode of the file they replace
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+DEFAULT_MODE = 0o666 & ~_UMASK
+
 
 class JSONFile:
 
@@ -40,13 +49,88 @@ class JSONFile:
             with open(self.path, "w") as f:
                 f.write("{}")
 
-    def _clear(self, f: TextIO) -> None:
-        f.seek(0)
-        f.truncate(0)
+        # set while a session is active, all calls then work on this dict
+        self._data: Optional[Dict[str, Any]] = None
+        self._session_depth: int = 0
+        # last known content, reused as long as the file wasn't changed by someone else
+        self._cache: Optional[Dict[str, Any]] = None
+        self._cache_stat: Optional[Tuple[int, int]] = None
 
-    def get(self, key: str) -> Optional[Any]:
-        with open(self.path, "r") as f:
+    def _stat(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is not None:
+            return self._data
+
+        stat = self._stat()
+        if self._cache is not None and self._cache_stat == stat:
+            return self._cache
+
+        with metrics.timer("storage_read"), open(self.path, "r") as f:
             data = json.load(f)
+        metrics.inc("storage_read_bytes", stat[1])
+
+        self._cache = data
+        self._cache_stat = stat
+        return data
+
+    def _get_mode(self) -> int:
+        try:
+            return os.stat(self.path).st_mode & 0o777
+        except FileNotFoundError:
+            return DEFAULT_MODE
+
+    def _dump(self, data: Dict[str, Any]) -> None:
+        if self._data is not None:
+            self._data = data
+            return
+
+        # write to a temp file first so a crash never leaves a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        try:
+            with metrics.timer("storage_write"), os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=4)
+                metrics.inc("storage_written_bytes", f.tell())
+                # on disk before the rename, or a power loss could leave an empty file under the real name
+                f.flush()
+                os.fsync(f.fileno())
+                os.fchmod(f.fileno(), self._get_mode())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            self._cache = None
+            os.remove(tmp_path)
+            raise
+
+        self._cache = data
+        self._cache_stat = self._stat()
+
+    @contextmanager
+    def session(self) -> Iterator[None]:
+        # load the file once and flush it once at the end, changes are discarded on error
+        if self._session_depth == 0:
+            self._data = self._load()
+
+        self._session_depth += 1
+        try:
+            yield
+        except BaseException:
+            if self._session_depth == 1:
+                # the cached dict might have been changed in place
+                self._data = None
+                self._cache = None
+            raise
+        else:
+            if self._session_depth == 1:
+                data = self._data
+                self._data = None
+                self._dump(data)  # type: ignore
+        finally:
+            self._session_depth -= 1
+
+    def get(self, key: str) -> Optional[Any]:
+        data = self._load()
 
         try:
             value = data[key]
@@ -55,26 +139,17 @@ class JSONFile:
         return value
 
     def set(self, *, key: str, value: Any) -> None:
-        with open(self.path, "r+") as f:
-            data = json.load(f)
-            data[key] = value
-
-            self._clear(f)
-            json.dump(data, f, indent=4)
+        data = self._load()
+        data[key] = value
+        self._dump(data)
 
     def delete(self, key: str) -> None:
-        with open(self.path, "r+") as f:
-            data = json.load(f)
-            del data[key]
-
-            self._clear(f)
-            json.dump(data, f, indent=4)
+        data = self._load()
+        del data[key]
+        self._dump(data)
 
     def read(self) -> Dict[str, Any]:
-        with open(self.path, "r") as f:
-            data = json.load(f)
-        return data
+        return self._load()
 
     def write(self, data: Dict[str, Any]) -> None:
-        with open(self.path, "w") as f:
-            json.dump(data, f, indent=4)
+        self._dump(data)
@@ -0,0 +1,174 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Set, Tuple
+
+from .json_file import JSONFile
+from .playlist_mirror import PlaylistMirror
+from .song import Song
+from .spotify import ADD, REMOVE, SpotifyPlaylist
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistOutbox:
+
+    def __init__(self, path: str):
+        self.json_file: JSONFile = JSONFile(path)
+        # per playlist id the pending operation and the number of attempts to send it, by uri
+        self._pending: Dict[str, Dict[str, List]] = {}
+        # playlist ids whose storage may have committed changes which weren't queued yet
+        self._committing: Set[str] = set()
+        self._load()
+
+    def _load(self) -> None:
+        # copied, the file caches what it read and the entries are changed in place
+        data = self.json_file.read()
+        self._pending = {
+            playlist_id: {uri: list(entry) for uri, entry in pending.items()}
+            for playlist_id, pending in data.get("pending", {}).items()
+        }
+        self._committing = set(data.get("committing", []))
+
+    def __len__(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def get_pending(self, playlist: SpotifyPlaylist) -> Dict[str, str]:
+        return {uri: op for uri, (op, _) in self._pending.get(playlist.id, {}).items()}
+
+    def mark_committing(self, playlist: SpotifyPlaylist) -> None:
+        # saved before the storage commits, if the changes aren't queued afterwards the playlist is compared
+        # against Spotify on the next reconciliation
+        self._committing.add(playlist.id)
+        self.save()
+
+    def is_committing(self, playlist: SpotifyPlaylist) -> bool:
+        return playlist.id in self._committing
+
+    def clear_committing(self, playlist: SpotifyPlaylist) -> None:
+        self._committing.discard(playlist.id)
+
+    def restore_known_uris(self, playlist: SpotifyPlaylist) -> None:
+        # known uris come from storage, which already contains changes that didn't reach Spotify yet
+        if playlist.known_uris is None:
+            return
+        for uri, op in self.get_pending(playlist).items():
+            if op == ADD:
+                playlist.known_uris.discard(uri)
+            else:
+                playlist.known_uris.add(uri)
+
+    def enqueue(self, playlist: SpotifyPlaylist, *, add: List[Song], remove: List[Song]) -> None:
+        self.enqueue_uris(
+            playlist,
+            add=[song.uri for song in add],
+            remove=[song.uri for song in remove],
+        )
+
+    def enqueue_uris(self, playlist: SpotifyPlaylist, *, add: List[str], remove: List[str]) -> None:
+        pending = self._pending.setdefault(playlist.id, {})
+        for op, uris in ((REMOVE, remove), (ADD, add)):
+            for uri in uris:
+                entry = pending.get(uri)
+                if entry is None:
+                    pending[uri] = [op, 0]
+                elif entry[0] != op:
+                    if entry[1] == 0:
+                        # never sent, so both operations cancel out
+                        del pending[uri]
+                    else:
+                        # an earlier attempt might have reached Spotify, so the new operation has to be sent
+                        pending[uri] = [op, 0]
+
+        if not pending:
+            del self._pending[playlist.id]
+
+    def iter_chunks(self, playlist: SpotifyPlaylist) -> Iterator[Tuple[str, List[str], List[str]]]:
+        # yields (operation, uris, uris to remove first), removals before additions
+        pending = self._pending.get(playlist.id, {})
+        remove_items = [uri for uri, (op, _) in pending.items() if op == REMOVE]
+        add_items = [uri for uri, (op, _) in pending.items() if op == ADD]
+
+        if playlist.known_uris is not None:
+            # already applied, e.g. by an attempt which failed only after Spotify processed it
+            skipped = [uri for uri in remove_items if uri not in playlist.known_uris]
+            skipped += [uri for uri in add_items if uri in playlist.known_uris]
+            self.complete(playlist, skipped)
+            remove_items = [uri for uri in remove_items if uri in playlist.known_uris]
+            add_items = [uri for uri in add_items if uri not in playlist.known_uris]
+
+        for chunk in playlist.chunks(remove_items):
+            yield REMOVE, chunk, []
+        for chunk in playlist.chunks(add_items):
+            # adding twice would duplicate the track, so retried additions are removed first
+            retried = [uri for uri in chunk if pending[uri][1] > 0]
+            yield ADD, chunk, retried
+
+    def mark_attempted(self, playlist: SpotifyPlaylist, uris: List[str]) -> None:
+        pending = self._pending.get(playlist.id, {})
+        for uri in uris:
+            if uri in pending:
+                pending[uri][1] += 1
+        # saved before sending, so a crash during the request still counts as an attempt
+        self.save()
+
+    def complete(self, playlist: SpotifyPlaylist, uris: List[str]) -> None:
+        pending = self._pending.get(playlist.id)
+        if pending is None or not uris:
+            return
+        for uri in uris:
+            pending.pop(uri, None)
+        if not pending:
+            del self._pending[playlist.id]
+        self.save()
+
+    def drain(self, playlists: List[SpotifyPlaylist], mirror: PlaylistMirror) -> None:
+        for playlist in playlists:
+            try:
+                for op, chunk, retried in self.iter_chunks(playlist):
+                    self.mark_attempted(playlist, chunk)
+                    mirror.invalidate(playlist)
+                    if retried:
+                        playlist.send(REMOVE, retried)
+                    playlist.send(op, chunk)
+                    self.complete(playlist, chunk)
+            except Exception:
+                # everything not sent stays in the outbox for the next tick
+                logger.exception(f"failed to update playlist '{playlist.name}', retry on next tick")
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        try:
+            yield
+        except BaseException:
+            self._load()
+            raise
+        else:
+            self.save()
+
+    def save(self) -> None:
+        self.json_file.write({"pending": self._pending, "committing": sorted(self._committing)})
@@ -0,0 +1,128 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import datetime
+import json
+import logging
+import os
+from collections import deque
+from itertools import groupby
+from typing import Deque, Iterable, Iterator, List, Optional
+
+from .metrics import metrics
+from .song import Play
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlayLog:
+
+    # one file per utc day, each line is [played_at, uri, title, artist]
+    EXTENSION = ".jsonl"
+    # plays kept in memory to estimate the play density
+    RECENT_PLAYS = 16
+
+    def __init__(self, directory: str):
+        self.directory: str = directory
+        os.makedirs(self.directory, exist_ok=True)
+        # played_at of the latest plays, oldest first
+        self.recent_played_at: Deque[int] = deque(maxlen=self.RECENT_PLAYS)
+        self.last_played_at: Optional[int] = self._read_last_played_at()
+
+    @staticmethod
+    def get_partition(played_at: int) -> str:
+        return datetime.datetime.fromtimestamp(played_at, datetime.timezone.utc).date().isoformat()
+
+    def _get_path(self, partition: str) -> str:
+        return os.path.join(self.directory, f"{partition}{self.EXTENSION}")
+
+    def partitions(self) -> List[str]:
+        names = [name for name in os.listdir(self.directory) if name.endswith(self.EXTENSION)]
+        return sorted(name[: -len(self.EXTENSION)] for name in names)
+
+    def _read_last_played_at(self) -> Optional[int]:
+        for partition in reversed(self.partitions()):
+            last_play = None
+            for last_play in self._iter_partition(partition):
+                self.recent_played_at.append(last_play.played_at)
+            if last_play is not None:
+                return last_play.played_at
+        return None
+
+    def _iter_partition(self, partition: str) -> Iterator[Play]:
+        with open(self._get_path(partition), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    played_at, uri, title, artist = json.loads(line)
+                except ValueError:
+                    # torn line of an interrupted append
+                    logger.warning(f"skipping invalid line in play log partition {partition}")
+                    continue
+                yield Play(uri=uri, title=title, artist=artist, played_at=played_at)
+
+    def append(self, plays: Iterable[Play]) -> int:
+        # plays already logged are skipped, so appending a retried batch is a no-op
+        new_plays = sorted(
+            (play for play in plays if self.last_played_at is None or play.played_at > self.last_played_at),
+            key=lambda play: play.played_at,
+        )
+
+        for partition, group in groupby(new_plays, key=lambda play: self.get_partition(play.played_at)):
+            lines = [
+                json.dumps([play.played_at, play.uri, play.title, play.artist], separators=(",", ":"))
+                for play in group
+            ]
+            with open(self._get_path(partition), "ab+") as f:
+                # terminate a torn line first so the new plays stay readable
+                end = f.seek(0, os.SEEK_END)
+                if end > 0:
+                    f.seek(end - 1)
+                    if f.read(1) != b"\n":
+                        lines.insert(0, "")
+                f.write("\n".join(lines).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        if new_plays:
+            self.recent_played_at.extend(play.played_at for play in new_plays)
+            self.last_played_at = new_plays[-1].played_at
+            metrics.inc("play_log_appended", len(new_plays))
+        return len(new_plays)
+
+    def get_play_interval(self) -> Optional[float]:
+        # average time between the latest plays, breaks without music included
+        if len(self.recent_played_at) < 2:
+            return None
+        return (self.recent_played_at[-1] - self.recent_played_at[0]) / (len(self.recent_played_at) - 1)
+
+    def iter_plays(self, since: Optional[int] = None) -> Iterator[Play]:
+        # oldest first, only plays after since
+        first_partition = self.get_partition(since) if since is not None else None
+        for partition in self.partitions():
+            if first_partition is not None and partition < first_partition:
+                continue
+            for play in self._iter_partition(partition):
+                if since is None or play.played_at > since:
+                    yield play
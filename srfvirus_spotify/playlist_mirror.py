@@ -0,0 +1,81 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+from typing import Any, Dict, List
+
+from .json_file import JSONFile
+from .metrics import metrics
+from .spotify import SpotifyPlaylist
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistMirror:
+
+    def __init__(self, path: str):
+        self.json_file: JSONFile = JSONFile(path)
+        # per playlist id the snapshot id, its track uris and when it was last reconciled
+        self._mirrors: Dict[str, Dict[str, Any]] = {
+            playlist_id: dict(mirror) for playlist_id, mirror in self.json_file.read().items()
+        }
+
+    def is_due(self, playlist: SpotifyPlaylist, *, now: int, interval: int) -> bool:
+        mirror = self._mirrors.get(playlist.id)
+        return mirror is None or now >= mirror["reconciled_at"] + interval
+
+    def refresh(self, playlist: SpotifyPlaylist) -> List[str]:
+        # the snapshot id changes with every change, the items are only paged when it did
+        snapshot_id = playlist.get_snapshot_id()
+        mirror = self._mirrors.get(playlist.id)
+        if mirror is not None and mirror["snapshot_id"] == snapshot_id:
+            metrics.inc("playlist_mirror_hit", playlist=playlist.name)
+            return mirror["uris"]
+
+        metrics.inc("playlist_mirror_miss", playlist=playlist.name)
+        # a change between both calls leaves an older snapshot id, so it's only paged again next time
+        uris = playlist.get_uris()
+        self._mirrors[playlist.id] = {
+            "snapshot_id": snapshot_id,
+            "uris": uris,
+            "reconciled_at": mirror["reconciled_at"] if mirror is not None else 0,
+        }
+        return uris
+
+    def invalidate(self, playlist: SpotifyPlaylist) -> None:
+        # the snapshot id after an own change also covers edits by others since the last reconcile, so the
+        # items are paged again on the next reconcile instead of trusting it
+        mirror = self._mirrors.get(playlist.id)
+        if mirror is not None:
+            mirror["snapshot_id"] = None
+
+    def mark_reconciled(self, playlist: SpotifyPlaylist, now: int) -> None:
+        mirror = self._mirrors.get(playlist.id)
+        if mirror is not None:
+            mirror["reconciled_at"] = now
+            self.save()
+
+    def save(self) -> None:
+        self.json_file.write(self._mirrors)
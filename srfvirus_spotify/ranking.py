@@ -0,0 +1,108 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import bisect
+import logging
+from typing import Dict, List, Set, Tuple, Iterable
+
+from .json_file import JSONFile
+from .song import Song
+
+
+logger = logging.getLogger(__name__)
+
+
+RankingKey = Tuple[int, int, str]
+
+
+class RankingIndex:
+
+    def __init__(self, path: str, *, deadline: int, limit: int):
+        self.json_file: JSONFile = JSONFile(path)
+        self.deadline: int = deadline
+        self.limit: int = limit
+
+        data = self.json_file.read()
+        # ascending by (count, played_at), so the best ranked songs are at the end
+        self._keys: List[RankingKey] = [tuple(key) for key in data.get("keys", [])]
+        self._by_uri: Dict[str, RankingKey] = {key[2]: key for key in self._keys}
+        # uris which were ranked within the boundary on the last call of pop_left()
+        self._ranked: Set[str] = set(data.get("ranked", []))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def rebuild(self, songs: Iterable[Song]) -> None:
+        songs = list(songs)
+        self._keys = sorted((song.count, song.played_at, song.uri) for song in songs)
+        self._by_uri = {key[2]: key for key in self._keys}
+        self._ranked = {song.uri for song in songs if song.in_playlist}
+
+    def update(self, song: Song) -> None:
+        self._discard(song.uri)
+        key = (song.count, song.played_at, song.uri)
+        bisect.insort(self._keys, key)
+        self._by_uri[song.uri] = key
+
+    def _discard(self, uri: str) -> None:
+        key = self._by_uri.pop(uri, None)
+        if key is not None:
+            i = bisect.bisect_left(self._keys, key)
+            del self._keys[i]
+
+    def remove(self, song: Song) -> None:
+        self._discard(song.uri)
+        self._ranked.discard(song.uri)
+
+    def top(self, n: int) -> List[str]:
+        # highest ranked first
+        return [key[2] for key in reversed(self._keys[-n:])] if n > 0 else []
+
+    def pop_left(self, n: int) -> List[str]:
+        # uris that dropped out of the top n since the last call
+        top = set(self.top(n))
+        left = [uri for uri in self._ranked if uri not in top]
+        self._ranked = top
+        return left
+
+    def prune(self, now: int) -> List[str]:
+        # a song past its deadline starts over at its next play, below the top it would only come back
+        # to be expired right away, so drop it instead of keeping every song ever played
+        boundary = max(len(self._keys) - self.limit, 0)
+        cutoff = now - self.deadline
+        kept = []
+        pruned = []
+        for key in self._keys[:boundary]:
+            if key[1] > cutoff or key[2] in self._ranked:
+                kept.append(key)
+            else:
+                del self._by_uri[key[2]]
+                pruned.append(key[2])
+
+        if pruned:
+            self._keys = kept + self._keys[boundary:]
+        return pruned
+
+    def save(self) -> None:
+        self.json_file.write({"keys": self._keys, "ranked": list(self._ranked)})
@@ -0,0 +1,88 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+
+    def __init__(self, *, rate: float, capacity: int, min_rate: float = 0.2):
+        self.max_rate: float = rate
+        self.min_rate: float = min_rate
+        self.rate: float = rate
+        self.capacity: int = capacity
+
+        self._tokens: float = capacity
+        self._updated_at: float = time.monotonic()
+        self._blocked_until: float = 0.0
+        self._lock: threading.Lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def _reserve(self) -> float:
+        # takes a token and returns 0, or returns how long to wait before trying again
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            elif self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            else:
+                return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        while (wait := self._reserve()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        while (wait := self._reserve()) > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, retry_after: float) -> None:
+        # called on 429: pause everyone and halve the rate (multiplicative decrease)
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._tokens = 0
+            self._updated_at = now
+            self.rate = max(self.min_rate, self.rate / 2)
+
+        logger.warning(f"rate limited, pausing for {retry_after}s at {self.rate:.2f} requests/s")
+
+    def reward(self) -> None:
+        # called on success: slowly recover the rate (additive increase)
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
@@ -0,0 +1,139 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import datetime
+import logging
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from .env import Env
+from .song import Play
+from .srf import SRF_VIRUS_CHANNEL_ID
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistRule:
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        playlist_id: str,
+        deadline: int,
+        channel_id: str = SRF_VIRUS_CHANNEL_ID,
+        threshold: int = 1,
+        window: Optional[int] = None,
+        bucket: int = int(datetime.timedelta(hours=1).total_seconds()),
+        rank_limit: Optional[int] = None,
+        weekdays: Optional[Iterable[int]] = None,
+        hours: Optional[Tuple[int, int]] = None,
+        timezone: str = "Europe/Zurich",
+    ):
+        self.name: str = name
+        self.playlist_id: str = playlist_id
+        # SRF radio channel the plays come from
+        self.channel_id: str = channel_id
+        # songs leave the playlist if they weren't retained within the deadline
+        self.deadline: int = deadline
+        # plays needed to retain a song, counted within the window or else until the deadline
+        self.threshold: int = threshold
+        self.window: Optional[int] = window
+        self.bucket: int = bucket
+        # only the best ranked songs are in the playlist, by count and then played_at
+        self.rank_limit: Optional[int] = rank_limit
+        # local time filter, isoweekday and [start, end) hours
+        self.weekdays: Optional[FrozenSet[int]] = frozenset(weekdays) if weekdays is not None else None
+        self.hours: Optional[Tuple[int, int]] = hours
+        self.timezone: str = timezone
+
+    def __repr__(self) -> str:
+        return f"<PlaylistRule name={self.name!r}>"
+
+    @property
+    def has_time_filter(self) -> bool:
+        return self.weekdays is not None or self.hours is not None
+
+    def matches(self, local_time: datetime.datetime) -> bool:
+        if self.weekdays is not None and local_time.isoweekday() not in self.weekdays:
+            return False
+        if self.hours is not None and not (self.hours[0] <= local_time.hour < self.hours[1]):
+            return False
+        return True
+
+    def is_active(self, timestamp: float) -> bool:
+        # whether plays at this time are collected, always if there is no time filter
+        if not self.has_time_filter:
+            return True
+        return self.matches(datetime.datetime.fromtimestamp(timestamp, ZoneInfo(self.timezone)))
+
+
+def match_plays(rules: Sequence[PlaylistRule], plays: List[Play]) -> List[List[Play]]:
+    # one pass over the plays for all rules, the local time is computed once per play and time zone
+    filtered = [i for i, rule in enumerate(rules) if rule.has_time_filter]
+    matched = [plays if not rule.has_time_filter else [] for rule in rules]
+    if not filtered:
+        return matched
+
+    zones = {rules[i].timezone: ZoneInfo(rules[i].timezone) for i in filtered}
+    for play in plays:
+        local_times: Dict[str, datetime.datetime] = {}
+        for i in filtered:
+            rule = rules[i]
+            local_time = local_times.get(rule.timezone)
+            if local_time is None:
+                local_time = datetime.datetime.fromtimestamp(play.played_at, zones[rule.timezone])
+                local_times[rule.timezone] = local_time
+            if rule.matches(local_time):
+                matched[i].append(play)
+
+    return matched
+
+
+TRENDING_NOW = PlaylistRule(
+    name="trending_now",
+    playlist_id=Env.SPOTIFY_TRENDING_NOW_PLAYLIST_ID,
+    deadline=int(datetime.timedelta(weeks=1).total_seconds()),
+    threshold=2,
+    window=int(datetime.timedelta(weeks=1).total_seconds()),
+)
+
+TOP_100 = PlaylistRule(
+    name="top_100",
+    playlist_id=Env.SPOTIFY_TOP_100_PLAYLIST_ID,
+    deadline=int(datetime.timedelta(days=10).total_seconds()),
+    rank_limit=100,
+)
+
+NIGHT_OUT = PlaylistRule(
+    name="night_out",
+    playlist_id=Env.SPOTIFY_NIGHT_OUT_PLAYLIST_ID,
+    deadline=int(datetime.timedelta(weeks=3).total_seconds()),
+    # saturday from 20:00
+    weekdays=[6],
+    hours=(20, 24),
+)
+
+RULES: List[PlaylistRule] = [TRENDING_NOW, TOP_100, NIGHT_OUT]
@@ -0,0 +1,110 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Iterator, Union
+
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .aio import AsyncApp
+    from .app import App
+
+
+logger = logging.getLogger(__name__)
+
+
+TICK_LOCK_PATH = "./storage/.tick.lock"
+
+
+@contextmanager
+def tick_lock(path: str = TICK_LOCK_PATH) -> Iterator[bool]:
+    # held while a tick runs, yields False if another process is already running one
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            acquired = False
+        else:
+            acquired = True
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class PollScheduler:
+
+    def __init__(self, app: Union[App, AsyncApp]):
+        self.app: Union[App, AsyncApp] = app
+        self._stopped: threading.Event = threading.Event()
+
+    def stop(self, *_: Any) -> None:
+        # a running tick still finishes
+        logger.info("stopping after the current tick")
+        self._stopped.set()
+
+    def _tick(self) -> None:
+        with tick_lock() as acquired:
+            if not acquired:
+                logger.warning("skipping tick, another one is still running")
+                metrics.inc("scheduler_skipped_ticks")
+                return
+
+            try:
+                self.app.tick()
+            except Exception:
+                # like a failed job, the next tick tries again
+                logger.exception("tick failed")
+
+    def run(self) -> None:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+
+        next_run_at = time.time()
+        delay = 0.0
+        while not self._stopped.wait(max(next_run_at - time.time(), 0)):
+            # runs missed while a tick or the machine was stalled are coalesced into this one
+            late = time.time() - next_run_at
+            if delay > 0 and late >= delay:
+                logger.info(f"coalescing {int(late // delay)} missed ticks")
+                metrics.inc("scheduler_coalesced_ticks", int(late // delay))
+
+            self._tick()
+
+            now = time.time()
+            delay = self.app.get_poll_delay(now)
+            next_run_at = now + delay
+            logger.info(f"next tick in {int(delay)}s")
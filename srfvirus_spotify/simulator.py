@@ -0,0 +1,247 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import argparse
+import contextlib
+import copy
+import datetime
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import types
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Any, Dict, Iterator, List, Optional
+
+from .app import App, replay
+from .cache_handler import SongResolutionCacheHandler
+from .play_log import PlayLog
+from .rate_limiter import RateLimiter
+from .rules import RULES, PlaylistRule
+from .song import Play
+from .srf import SongCollection
+from .storage_handler import SongsMetadataFileHandler
+
+
+logger = logging.getLogger(__name__)
+
+
+DAY = int(datetime.timedelta(days=1).total_seconds())
+
+# plays handed to the worker processes once instead of with every simulation
+_plays: List[Play] = []
+
+
+def load_play_log(directory: str) -> List[Play]:
+    return list(PlayLog(directory).iter_plays())
+
+
+def load_songlist(path: str) -> List[Play]:
+    # raw songs as returned by the SRGSSR Audio API, the uri stands in for the Spotify search
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    plays = []
+    for raw_song in data["songList"] if isinstance(data, dict) else data:
+        title = raw_song["title"]
+        artist = raw_song["artist"]["name"]
+        plays.append(
+            Play(
+                uri=f"srf:{SongResolutionCacheHandler.encode_key(title=title, artist=artist)}",
+                title=title,
+                artist=artist,
+                played_at=int(datetime.datetime.fromisoformat(raw_song["date"]).timestamp()),
+            )
+        )
+
+    plays.sort(key=lambda play: play.played_at)
+    return plays
+
+
+def synthesize(
+    *,
+    days: int,
+    seed: int = 0,
+    catalog_size: int = 2000,
+    interval: int = 210,
+    start: int = 1704067200,
+) -> List[Play]:
+    # a song every few minutes, a few songs are on heavy rotation and most are played rarely
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(catalog_size)]
+    numbers = rng.choices(range(catalog_size), weights=weights, k=days * DAY // interval)
+    return [
+        Play(
+            uri=f"spotify:track:{number}",
+            title=f"Song {number}",
+            artist=f"Artist {number % 97}",
+            played_at=played_at,
+        )
+        for number, played_at in zip(numbers, range(start, start + days * DAY, interval))
+    ]
+
+
+@contextlib.contextmanager
+def _isolated_storage() -> Iterator[None]:
+    # collections keep their state below ./storage, so every simulation gets its own working directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="srfvirus-sim-") as directory:
+        os.chdir(directory)
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
+
+
+def _create_srf() -> Any:
+    # stands in for SRF, nothing is fetched and playlists are never sent to Spotify
+    return types.SimpleNamespace(
+        spotify=types.SimpleNamespace(client=None, rate_limiter=RateLimiter(rate=1, capacity=1)),
+        metadata=SongsMetadataFileHandler("./storage/songs_metadata.json"),
+        current_plays=[],
+    )
+
+
+def simulate(
+    rule: PlaylistRule,
+    plays: Optional[List[Play]] = None,
+    *,
+    window: int = App.REPLAY_WINDOW,
+) -> Dict[str, Any]:
+    if plays is None:
+        plays = _plays
+
+    events = []
+    with _isolated_storage():
+        collection = SongCollection(srf=_create_srf(), rule=rule)
+        with collection.transaction():
+            for now, new_songs, old_songs in replay(collection, plays, window=window):
+                add_items, remove_items = collection.playlist.plan_mutation(add=new_songs, remove=old_songs)
+                collection.playlist.mark_removed(remove_items)
+                collection.playlist.mark_added(add_items)
+                # sorted, so the output doesn't depend on set ordering
+                events.extend([now, "remove", uri] for uri in sorted(remove_items))
+                events.extend([now, "add", uri] for uri in sorted(add_items))
+
+        playlist = sorted(collection.playlist.known_uris or [])
+
+    return {
+        "rule": rule.name,
+        "params": {
+            "threshold": rule.threshold,
+            "deadline": rule.deadline,
+            "window": rule.window,
+            "rank_limit": rule.rank_limit,
+        },
+        "adds": sum(1 for event in events if event[1] == "add"),
+        "removes": sum(1 for event in events if event[1] == "remove"),
+        "playlist": playlist,
+        "events": events,
+    }
+
+
+def sweep_rules(rule: PlaylistRule, **params: List[Any]) -> List[PlaylistRule]:
+    # one copy of the rule per combination of the given attribute values
+    rules = []
+    names = list(params)
+    for values in product(*params.values()):
+        variant = copy.copy(rule)
+        for name, value in zip(names, values):
+            setattr(variant, name, value)
+        rules.append(variant)
+    return rules
+
+
+def _init_worker(plays: List[Play]) -> None:
+    global _plays
+    _plays = plays
+
+
+def run_sweep(
+    rules: List[PlaylistRule],
+    plays: List[Play],
+    *,
+    workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(plays,)) as executor:
+        return list(executor.map(simulate, rules))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m srfvirus_spotify.simulator")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--play-log", help="directory of a recorded play log")
+    source.add_argument("--songlist", help="json file with raw songs of the SRGSSR Audio API")
+    source.add_argument("--synthetic-days", type=int, help="generate this many days of plays")
+    parser.add_argument("--seed", type=int, default=0, help="seed for synthetic plays")
+    parser.add_argument("--rule", action="append", help="name of a rule to simulate, all by default")
+    parser.add_argument("--threshold", type=int, nargs="+", help="values of the play threshold to sweep")
+    parser.add_argument("--deadline-days", type=float, nargs="+", help="values of the deadline to sweep")
+    parser.add_argument("--window-days", type=float, nargs="+", help="values of the counting window to sweep")
+    parser.add_argument("--rank-limit", type=int, nargs="+", help="values of the rank limit to sweep")
+    parser.add_argument("--workers", type=int, help="number of worker processes")
+    parser.add_argument("--events", action="store_true", help="include every add and remove in the output")
+    parser.add_argument("--output", help="write the results to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.play_log is not None:
+        plays = load_play_log(args.play_log)
+    elif args.songlist is not None:
+        plays = load_songlist(args.songlist)
+    else:
+        plays = synthesize(days=args.synthetic_days, seed=args.seed)
+
+    params: Dict[str, List[Any]] = {}
+    if args.threshold:
+        params["threshold"] = args.threshold
+    if args.deadline_days:
+        params["deadline"] = [int(days * DAY) for days in args.deadline_days]
+    if args.window_days:
+        params["window"] = [int(days * DAY) for days in args.window_days]
+    if args.rank_limit:
+        params["rank_limit"] = args.rank_limit
+
+    rules = []
+    for rule in RULES:
+        if args.rule is None or rule.name in args.rule:
+            rules.extend(sweep_rules(rule, **params))
+
+    results = run_sweep(rules, plays, workers=args.workers)
+    if not args.events:
+        for result in results:
+            del result["events"]
+
+    output = json.dumps({"plays": len(plays), "results": results}, indent=4)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,39 @@ if TYPE_CHECKING:
     from typing_extensions import Self
 
 
+class Play:
+
+    # shared by all collections, so it must not be changed
+    __slots__ = ("uri", "title", "artist", "played_at")
+
+    uri: str
+    title: str
+    artist: str
+    played_at: int
+
+    def __init__(self, *, uri: str, title: str, artist: str, played_at: int):
+        object.__setattr__(self, "uri", uri)
+        object.__setattr__(self, "title", title)
+        object.__setattr__(self, "artist", artist)
+        object.__setattr__(self, "played_at", played_at)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __repr__(self) -> str:
+        attrs = (
+            ("uri", self.uri),
+            ("title", self.title),
+            ("artist", self.artist),
+            ("played_at", self.played_at),
+        )
+        joined = " ".join([f"{k}={v!r}" for k, v in attrs])
+        return f"<Play {joined}>"
+
+
 class Song:
 
     def __init__(
@@ -76,6 +109,10 @@ class Song:
         }
         return ret
 
+    @classmethod
+    def from_play(cls, play: Play) -> Self:
+        return cls(uri=play.uri, title=play.title, artist=play.artist, played_at=play.played_at)
+
     @classmethod
     def from_storage_dict(cls, *, data: Dict[str, Any], uri: str) -> Self:
         return cls(
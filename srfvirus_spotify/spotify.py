@@ -26,12 +26,18 @@ from __future__ import annotations
 
 import logging
 import re
-from typing import TYPE_CHECKING, Optional, List
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Optional, List, Tuple, Set, Iterable, Callable, TypeVar, Any, Dict
 
-from spotipy import Spotify as SpotifyClient, SpotifyOAuth
+from spotipy import Spotify as SpotifyClient, SpotifyOAuth, SpotifyException
 
 from .env import Env
-from .cache_handler import TokenCacheFileHandler
+from .cache_handler import TokenCacheFileHandler, SongResolutionCacheHandler
+from .rate_limiter import RateLimiter
+from .token_manager import TokenManager
+from .metrics import metrics
 
 if TYPE_CHECKING:
     from .song import Song
@@ -40,59 +46,237 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+T = TypeVar("T")
+
+MAX_ATTEMPTS = 5
+
+# playlist mutations
+ADD = "add"
+REMOVE = "remove"
+
+
+def get_retry_delay(e: SpotifyException, attempt: int) -> Optional[float]:
+    # returns how long to back off before the next attempt, None if it shouldn't be retried
+    if attempt >= MAX_ATTEMPTS:
+        return None
+
+    if e.http_status == 429:
+        return int(e.headers.get("Retry-After", 2**attempt))
+    elif e.http_status >= 500:
+        return 2**attempt
+    else:
+        return None
+
+
+def _call_with_retry(
+    rate_limiter: RateLimiter,
+    func: Callable[..., T],
+    *args: Any,
+    idempotent: bool = True,
+    **kwargs: Any,
+) -> T:
+    # the only place requests are retried, spotipy's own retries are turned off
+    attempt = 1
+    while True:
+        rate_limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except SpotifyException as e:
+            delay = get_retry_delay(e, attempt)
+            # a server error may have been applied anyway, only a rejected 429 is safe to repeat then
+            if delay is None or (not idempotent and e.http_status != 429):
+                raise
+
+            metrics.inc("spotify_retries", status=e.http_status)
+            if e.http_status == 429:
+                rate_limiter.penalize(delay)
+            else:
+                # an outage says nothing about the rate, so only this call backs off
+                time.sleep(delay)
+            attempt += 1
+        else:
+            rate_limiter.reward()
+            return result
+
+
 class Spotify:
 
     SCOPES = "playlist-read-private,playlist-modify-private,playlist-modify-public"
 
     def __init__(self):
+        cache_handler = TokenCacheFileHandler("./.cache/.spotify_token")
+        self.auth_manager: SpotifyOAuth = SpotifyOAuth(
+            client_id=Env.SPOTIFY_CLIENT_ID,
+            client_secret=Env.SPOTIFY_CLIENT_SECRET,
+            redirect_uri="http://example.com",
+            scope=self.SCOPES,
+            cache_handler=cache_handler,
+        )
+        self.token_manager: TokenManager = TokenManager(
+            name="spotify",
+            cache_handler=cache_handler,
+            refresh=self._refresh_token,
+        )
+        self.token_manager.start()
         self.client = SpotifyClient(
-            auth_manager=SpotifyOAuth(
-                client_id=Env.SPOTIFY_CLIENT_ID,
-                client_secret=Env.SPOTIFY_CLIENT_SECRET,
-                redirect_uri="http://example.com",
-                scope=self.SCOPES,
-                cache_handler=TokenCacheFileHandler("./.cache/.spotify_token"),
-            ),
+            auth_manager=self.auth_manager,
             requests_timeout=10,
+            # retried by _call_with_retry, so 429 goes through the shared rate limiter and 5xx isn't repeated
+            # within each attempt, an empty forcelist keeps the real status instead of a "max retries" 429
+            retries=0,
+            status_retries=0,
+            status_forcelist=(),
         )
+        self.client.prefix = f"{Env.SPOTIFY_API_BASE_URL}/"
+        self.rate_limiter: RateLimiter = RateLimiter(rate=5, capacity=5)
+        self.resolution_cache: SongResolutionCacheHandler = SongResolutionCacheHandler(
+            "./storage/spotify_resolutions.json"
+        )
+        # searches in flight by cache key, so channels playing the same song search it only once
+        self._searches: Dict[str, Future[Optional[str]]] = {}
+        self._searches_lock: threading.Lock = threading.Lock()
 
-    def search_title(self, *, title: str, artist: str) -> Optional[str]:
+    def _refresh_token(self, token_info: Dict[str, Any]) -> Dict[str, Any]:
+        # the initial token has to be obtained interactively through the authorization code flow
+        return self.auth_manager.refresh_access_token(token_info["refresh_token"])
+
+    def close(self) -> None:
+        self.token_manager.stop()
+
+    @staticmethod
+    def build_search_query(*, title: str, artist: str) -> str:
         artist = re.sub("feat.", ",", artist, flags=re.IGNORECASE)
-        q = f"{title} {artist}"
-        search_results = self.client.search(q)
+        return f"{title} {artist}"
 
+    @staticmethod
+    def parse_search_results(search_results: Optional[Dict[str, Any]]) -> Optional[str]:
         track_uri = None
-        if search_results:
+        if search_results and search_results["tracks"]["items"]:
             track = search_results["tracks"]["items"][0]
             track_uri = track["uri"]
 
         return track_uri
 
+    def search_title(self, *, title: str, artist: str) -> Optional[str]:
+        q = self.build_search_query(title=title, artist=artist)
+        with metrics.timer("spotify_search"):
+            search_results = _call_with_retry(self.rate_limiter, self.client.search, q)
+        return self.parse_search_results(search_results)
+
+    def resolve_title(self, *, title: str, artist: str) -> Tuple[Optional[str], bool]:
+        # returns the uri and whether Spotify had to be searched for it
+        cached, track_uri = self.resolution_cache.get(title=title, artist=artist)
+        if cached:
+            return track_uri, False
+
+        key = self.resolution_cache.encode_key(title=title, artist=artist)
+        with self._searches_lock:
+            search = self._searches.get(key)
+            is_owner = search is None
+            if search is None:
+                search = self._searches[key] = Future()
+
+        if not is_owner:
+            return search.result(), False
+
+        try:
+            track_uri = self.search_title(title=title, artist=artist)
+            self.resolution_cache.set(title=title, artist=artist, uri=track_uri)
+        except BaseException as e:
+            search.set_exception(e)
+            raise
+        else:
+            search.set_result(track_uri)
+        finally:
+            with self._searches_lock:
+                del self._searches[key]
+
+        return track_uri, True
+
 
 class SpotifyPlaylist:
 
-    def __init__(self, *, client: SpotifyClient, id: str, name: str):
+    # Spotify rejects more items per request
+    MAX_ITEMS_PER_REQUEST = 100
+
+    def __init__(self, *, client: SpotifyClient, id: str, name: str, rate_limiter: RateLimiter):
         self._client: SpotifyClient = client
+        self._rate_limiter: RateLimiter = rate_limiter
         self.id: str = id
         self.name: str = name
+        # uris known to be in the playlist, None if unknown
+        self.known_uris: Optional[Set[str]] = None
 
     def __repr__(self) -> str:
         return f"<SpotifyPlaylist id={self.id} name={self.name}>"
 
-    def add_songs(self, songs: List[Song]) -> None:
-        items = []
-        for song in songs:
-            items.append(song.uri)
+    def set_known_uris(self, uris: Iterable[str]) -> None:
+        self.known_uris = set(uris)
+
+    def chunks(self, items: List[str]) -> Iterable[List[str]]:
+        for i in range(0, len(items), self.MAX_ITEMS_PER_REQUEST):
+            yield items[i : i + self.MAX_ITEMS_PER_REQUEST]
+
+    def plan_mutation(self, *, add: List[Song], remove: List[Song]) -> Tuple[List[str], List[str]]:
+        # dict keeps the order while removing duplicates
+        remove_items = list(dict.fromkeys(song.uri for song in remove))
+        add_items = [uri for uri in dict.fromkeys(song.uri for song in add) if uri not in remove_items]
+
+        if self.known_uris is not None:
+            add_items = [uri for uri in add_items if uri not in self.known_uris]
+            remove_items = [uri for uri in remove_items if uri in self.known_uris]
+
+        return add_items, remove_items
+
+    def mark_added(self, items: List[str]) -> None:
+        if self.known_uris is not None:
+            self.known_uris.update(items)
+
+    def mark_removed(self, items: List[str]) -> None:
+        if self.known_uris is not None:
+            self.known_uris.difference_update(items)
+
+    def get_snapshot_id(self) -> str:
+        with metrics.timer("spotify_playlist_snapshot", playlist=self.name):
+            data = _call_with_retry(self._rate_limiter, self._client.playlist, self.id, fields="snapshot_id")
+        if data is None:
+            raise ValueError(f"snapshot id of playlist '{self.name}' could not be retrieved")
+        return data["snapshot_id"]
+
+    def get_uris(self) -> List[str]:
+        # pages through the whole playlist, only the track uris are requested
+        uris = []
+        offset = 0
+        while True:
+            with metrics.timer("spotify_playlist_items", playlist=self.name):
+                data = _call_with_retry(
+                    self._rate_limiter,
+                    self._client.playlist_items,
+                    self.id,
+                    fields="items(track(uri)),next",
+                    limit=self.MAX_ITEMS_PER_REQUEST,
+                    offset=offset,
+                    additional_types=("track",),
+                )
+            if data is None:
+                raise ValueError(f"items of playlist '{self.name}' could not be retrieved")
+            uris.extend(item["track"]["uri"] for item in data["items"] if item.get("track"))
+            if data.get("next") is None:
+                return uris
+            offset += self.MAX_ITEMS_PER_REQUEST
 
-        if items:
-            logger.info(f"add items to playlist '{self.name.replace('_', ' ')}'")
-            self._client.playlist_add_items(self.id, items=items)
+    def send(self, op: str, items: List[str]) -> None:
+        # a single request, items must fit into one chunk
+        if op == ADD:
+            func = self._client.playlist_add_items
+        else:
+            func = self._client.playlist_remove_all_occurrences_of_items
 
-    def remove_songs(self, songs: List[Song]) -> None:
-        items = []
-        for song in songs:
-            items.append(song.uri)
+        with metrics.timer("spotify_playlist_mutation", playlist=self.name, op=op):
+            # adding again would duplicate the tracks, the outbox retries additions safely instead
+            _call_with_retry(self._rate_limiter, func, self.id, items=items, idempotent=op != ADD)
 
-        if items:
-            logger.info(f"remove items from playlist '{self.name.replace('_', ' ')}'")
-            self._client.playlist_remove_all_occurrences_of_items(self.id, items=items)
+        if op == ADD:
+            self.mark_added(items)
+        else:
+            self.mark_removed(items)
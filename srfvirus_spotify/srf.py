@@ -25,26 +25,38 @@ SOFTWARE.
 from __future__ import annotations
 
 import requests
+import random
 import time
 import datetime
 import logging
-import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from requests.auth import HTTPBasicAuth
-from typing import List, Dict, Any, Optional
-from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Union, Tuple, Iterator, Callable
+from urllib.parse import urlparse, parse_qs
 
 from .env import Env
 from .cache_handler import TokenCacheFileHandler
 from .errors import SRFHTTPException
-from .storage_handler import SongsStorageFileHandler, SongsMetadataFileHandler
-from .song import Song
+from .token_manager import TokenManager
+from .metrics import metrics
+from .storage_handler import SongsStorageFileHandler, SongsStorageSQLiteHandler, SongsMetadataFileHandler
+from .song import Song, Play
 from .spotify import SpotifyPlaylist, Spotify
+from .ranking import RankingIndex
+from .window_counter import WindowCounter
+from .expiry_index import ExpiryIndex
+from .play_log import PlayLog
+
+if TYPE_CHECKING:
+    from .rules import PlaylistRule
 
 
 logger = logging.getLogger(__name__)
 
 
-SRF_BASE_URL = "https://api.srgssr.ch"
+SRF_BASE_URL = Env.SRF_BASE_URL
 SRF_OAUTH_BASE_URL = f"{SRF_BASE_URL}/oauth/v1"
 SRF_AUDIO_BASE_URL = f"{SRF_BASE_URL}/audiometadata/v2"
 SRF_VIRUS_CHANNEL_ID = "66815fe2-9008-4853-80a5-f9caaffdf3a9"
@@ -52,21 +64,72 @@ SRF_VIRUS_CHANNEL_ID = "66815fe2-9008-4853-80a5-f9caaffdf3a9"
 
 class _SRFClient:
 
+    # (connect, read) in seconds
+    TIMEOUT = (5.0, 15.0)
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 10.0
+
     def __init__(
         self,
         *,
         client_id: str,
         client_secret: str,
         cache_handler: TokenCacheFileHandler,
+        timeout: Tuple[float, float] = TIMEOUT,
+        max_retries: int = MAX_RETRIES,
     ):
         self.client_id: str = client_id
         self.client_secret: str = client_secret
         self.cache_handler: TokenCacheFileHandler = cache_handler
+        self.timeout: Tuple[float, float] = timeout
+        self.max_retries: int = max_retries
+
+        # keep connections alive across requests
+        self.session: requests.Session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        # last songlist per channel with its ETag, sent along to get an empty 304 if it didn't change
+        self.song_lists: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+
+        self.token_manager: TokenManager = TokenManager(
+            name="srf",
+            cache_handler=cache_handler,
+            refresh=self._refresh_token,
+        )
+        self.token_manager.start()
+
+    def close(self) -> None:
+        self.token_manager.stop()
+        self.session.close()
+
+    def _send(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        attempt = 0
+        while True:
+            try:
+                with metrics.timer("srf_request", method=method, path=urlparse(url).path):
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                metrics.inc("srf_response_bytes", len(response.content))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"{method} {url} failed ({e.__class__.__name__}), retrying")
+            else:
+                if response.status_code < 500 or attempt >= self.max_retries:
+                    return response
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying")
 
-        self.__token: str = self._get_token()
+            time.sleep(self.get_backoff_delay(attempt))
+            attempt += 1
+
+    @classmethod
+    def get_backoff_delay(cls, attempt: int) -> float:
+        # exponential backoff with full jitter
+        delay = min(cls.BACKOFF_MAX, cls.BACKOFF_BASE * 2**attempt)
+        return random.uniform(0, delay)
 
     def _request_token(self) -> Dict[str, Any]:
-        response = requests.post(
+        response = self._send(
+            "POST",
             f"{SRF_OAUTH_BASE_URL}/accesstoken?grant_type=client_credentials",
             auth=HTTPBasicAuth(self.client_id, self.client_secret),
         )
@@ -77,21 +140,18 @@ class _SRFClient:
         else:
             raise SRFHTTPException(response=response, data=data)
 
-    def _get_token(self) -> str:
-        token_info = self.cache_handler.get_cached_token()
-        if not token_info:
-            token_info = self._request_token()
-            self._save_token_info(token_info)
-
-        return token_info["access_token"]
-
-    def _save_token_info(self, token_info: Dict[str, Any]) -> None:
+    def _refresh_token(self, _: Dict[str, Any]) -> Dict[str, Any]:
+        token_info = self._request_token()
         # add expire time to token info
         now = int(time.time())
-        expires_at = now + token_info["expires_in"]
-        token_info["expires_at"] = expires_at
+        token_info["expires_at"] = now + token_info["expires_in"]
+        return token_info
 
-        self.cache_handler.save_token_to_cache(token_info)
+    def _get_headers(self) -> Dict[str, str]:
+        return {
+            "Accept": "application/json",
+            "Authorization": f"Bearer {self.token_manager.access_token}",
+        }
 
     def _request(
         self,
@@ -101,25 +161,11 @@ class _SRFClient:
         params: Optional[Dict[str, Any]] = None,
         payload: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        # check if new token must be requested
-        token_info = self.cache_handler.get_cached_token()
-        expires_at = token_info["expires_at"]
-        now = int(time.time())
-
-        # use an offset of 1 minute as a buffer
-        if now >= (expires_at - 60):
-            token_info = self._request_token()
-            self._save_token_info(token_info)
-            self.__token = self._get_token()
-
-        headers = {
-            "Accept": "application/json",
-            "Authorization": f"Bearer {self.__token}",
-        }
+        headers = self._get_headers()
 
-        response = requests.request(
-            method=method,
-            url=f"{SRF_AUDIO_BASE_URL}{url}",
+        response = self._send(
+            method,
+            f"{SRF_AUDIO_BASE_URL}{url}",
             headers=headers,
             params=params,
             json=payload,
@@ -137,14 +183,70 @@ class _SRFClient:
         data = self._request("GET", "/radio/channels", params=params)
         return data["channelList"]
 
+    def get_song_list_headers(self, channel_id: str) -> Dict[str, str]:
+        cached = self.song_lists.get(channel_id)
+        return {"If-None-Match": cached[0]} if cached is not None else {}
+
+    def get_cached_song_list(self, channel_id: str) -> List[Dict[str, Any]]:
+        metrics.inc("srf_song_list_not_modified", channel=channel_id)
+        return self.song_lists[channel_id][1]
+
+    def set_cached_song_list(self, channel_id: str, etag: Optional[str], songs: List[Dict[str, Any]]) -> None:
+        if etag is not None:
+            self.song_lists[channel_id] = (etag, songs)
+        else:
+            self.song_lists.pop(channel_id, None)
+
     def fetch_song_list(self, channel_id: str) -> List[Dict[str, Any]]:
         params = {"bu": "srf", "channelId": channel_id}
-        data = self._request("GET", "/radio/songlist", params=params)
+        headers = {**self._get_headers(), **self.get_song_list_headers(channel_id)}
+        response = self._send("GET", f"{SRF_AUDIO_BASE_URL}/radio/songlist", headers=headers, params=params)
+        if response.status_code == 304 and channel_id in self.song_lists:
+            return self.get_cached_song_list(channel_id)
+
+        data = response.json()
+        if not 300 > response.status_code >= 200:
+            raise SRFHTTPException(response=response, data=data)
+
+        self.set_cached_song_list(channel_id, response.headers.get("ETag"), data["songList"])
         return data["songList"]
 
+    def iter_song_list(
+        self,
+        channel_id: str,
+        *,
+        from_date: datetime.datetime,
+        to_date: datetime.datetime,
+        page_size: int = 100,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        params: Dict[str, Any] = {
+            "bu": "srf",
+            "channelId": channel_id,
+            "from": from_date.isoformat(),
+            "to": to_date.isoformat(),
+            "pageSize": page_size,
+        }
+        while True:
+            data = self._request("GET", "/radio/songlist", params=params)
+            yield data["songList"]
+
+            next_page = data.get("next")
+            if not next_page:
+                break
+
+            # "next" is either a full url or just the cursor
+            if next_page.startswith("http"):
+                query = parse_qs(urlparse(next_page).query)
+                next_page = query["next"][0]
+            params["next"] = next_page
+
 
 class SRF:
 
+    RESOLVE_WORKERS = 4
+    # one backfill batch, roughly 100 songs
+    BACKFILL_WINDOW = int(datetime.timedelta(hours=6).total_seconds())
+
     def __init__(self):
         self.client: _SRFClient = _SRFClient(
             client_id=Env.SRF_CLIENT_ID,
@@ -153,237 +255,366 @@ class SRF:
         )
         self.spotify: Spotify = Spotify()
         self.metadata: SongsMetadataFileHandler = SongsMetadataFileHandler(f"./storage/songs_metadata.json")
-        self.current_songs: List[Song] = self._get_current_songs()
-
-    def _get_current_songs(self) -> List[Song]:
-        data = self.client.fetch_song_list(SRF_VIRUS_CHANNEL_ID)
-        last_timestamp = self.metadata.get("last_timestamp")
-
-        songs = []
-        for raw_song in data:
-            # check timestamp first to not search songs that are
-            # redundant from last request (and therefore not needed)
-            dt = datetime.datetime.fromisoformat(raw_song["date"])
-            played_at = int(dt.timestamp())
-            if played_at == last_timestamp:
-                break
-
-            uri = self.spotify.search_title(title=raw_song["title"], artist=raw_song["artist"]["name"])
+        # every resolved play per channel, collections are rebuilt from it
+        self.play_logs: Dict[str, PlayLog] = {}
+        self._play_logs_lock: threading.Lock = threading.Lock()
+        self.current_plays: List[Play] = []
+        # per channel when the song after the newest one in the songlist is expected to start
+        self.next_song_at: Dict[str, int] = {}
+
+    def close(self) -> None:
+        self.client.close()
+        self.spotify.close()
+
+    def list_channels(self) -> List[Dict[str, Any]]:
+        return self.client.fetch_radio_channels()
+
+    def get_play_log(self, channel_id: str) -> PlayLog:
+        with self._play_logs_lock:
+            play_log = self.play_logs.get(channel_id)
+            if play_log is None:
+                # the log of the virus channel predates multiple channels and stays in place
+                path = "./storage/plays"
+                if channel_id != SRF_VIRUS_CHANNEL_ID:
+                    path = f"{path}/{channel_id}"
+                play_log = self.play_logs[channel_id] = PlayLog(path)
+            return play_log
+
+    def get_last_timestamp(self, channel_id: str) -> Optional[int]:
+        last_timestamps = self.metadata.get("last_timestamps") or {}
+        last_timestamp = last_timestamps.get(channel_id)
+        if last_timestamp is None and channel_id == SRF_VIRUS_CHANNEL_ID:
+            # stored under a single key before there were multiple channels
+            last_timestamp = self.metadata.get("last_timestamp")
+        return last_timestamp
+
+    def _set_last_timestamp(self, channel_id: str, last_timestamp: int) -> None:
+        with self.metadata.lock():
+            last_timestamps = self.metadata.get("last_timestamps") or {}
+            last_timestamps[channel_id] = last_timestamp
+            self.metadata.set("last_timestamps", last_timestamps)
+
+    def _resolve_song(self, raw_song: Dict[str, Any]) -> Optional[str]:
+        uri, _ = self.spotify.resolve_title(title=raw_song["title"], artist=raw_song["artist"]["name"])
+        return uri
+
+    def _resolve_songs(self, raw_songs: List[Tuple[Dict[str, Any], int]]) -> List[Optional[str]]:
+        # searches are paced by the shared rate limiter, map keeps the order by played_at
+        with ThreadPoolExecutor(max_workers=self.RESOLVE_WORKERS) as executor:
+            return list(executor.map(self._resolve_song, [raw_song for raw_song, _ in raw_songs]))
+
+    def get_played_at(self, raw_song: Dict[str, Any]) -> int:
+        dt = datetime.datetime.fromisoformat(raw_song["date"])
+        return int(dt.timestamp())
+
+    def build_current_plays(
+        self,
+        channel_id: str,
+        raw_songs: List[Tuple[Dict[str, Any], int]],
+        uris: List[Optional[str]],
+    ) -> List[Play]:
+        plays = []
+        for (raw_song, played_at), uri in zip(raw_songs, uris):
             if uri is not None:
-                song = Song(
+                play = Play(
                     uri=uri,
                     title=raw_song["title"],
                     artist=raw_song["artist"]["name"],
                     played_at=played_at,
                 )
-                songs.append(song)
+                plays.append(play)
 
-            time.sleep(1)
+        cache = self.spotify.resolution_cache
+        logger.info(f"resolution cache: {cache.hits} hits, {cache.misses} misses")
+        cache.save()
 
-        if songs:
-            self.metadata.set("last_timestamp", songs[0].played_at)
+        # log before advancing the timestamp, so no play is lost in between
+        self.get_play_log(channel_id).append(plays)
+        if plays:
+            self._set_last_timestamp(channel_id, plays[0].played_at)
 
-        return songs
+        return plays
+
+    def update_next_song_at(self, channel_id: str, data: List[Dict[str, Any]]) -> None:
+        # the songlist is newest first, the next song starts once the newest one is over
+        if data and data[0].get("duration"):
+            self.next_song_at[channel_id] = self.get_played_at(data[0]) + data[0]["duration"] // 1000
+
+    def has_gap(self, data: List[Dict[str, Any]], last_timestamp: Optional[int]) -> bool:
+        # the page doesn't reach back to the last processed song, so songs in between are missing
+        if last_timestamp is None or not data:
+            return False
+        return min(self.get_played_at(raw_song) for raw_song in data) > last_timestamp
+
+    def iter_backfill(self, channel_id: str, last_timestamp: int) -> Iterator[List[Play]]:
+        # yields batches from oldest to newest, each batch newest first like the regular songlist
+        now = int(time.time())
+        logger.info(f"backfill songs of {channel_id} since {datetime.datetime.fromtimestamp(last_timestamp)}")
+
+        for start in range(last_timestamp, now, self.BACKFILL_WINDOW):
+            end = min(start + self.BACKFILL_WINDOW, now)
+            raw_songs = []
+            for page in self.client.iter_song_list(
+                channel_id,
+                from_date=datetime.datetime.fromtimestamp(start, datetime.timezone.utc),
+                to_date=datetime.datetime.fromtimestamp(end, datetime.timezone.utc),
+            ):
+                for raw_song in page:
+                    played_at = self.get_played_at(raw_song)
+                    if last_timestamp < played_at:
+                        raw_songs.append((raw_song, played_at))
+
+            if not raw_songs:
+                continue
+
+            raw_songs.sort(key=lambda x: x[1], reverse=True)
+            plays = self.build_current_plays(channel_id, raw_songs, self._resolve_songs(raw_songs))
+            if plays:
+                last_timestamp = plays[0].played_at
+                yield plays
+
+    def iter_current_plays(self, channel_id: str = SRF_VIRUS_CHANNEL_ID) -> Iterator[List[Play]]:
+        data = self.client.fetch_song_list(channel_id)
+        self.update_next_song_at(channel_id, data)
+        last_timestamp = self.get_last_timestamp(channel_id)
+
+        if self.has_gap(data, last_timestamp):
+            yield from self.iter_backfill(channel_id, last_timestamp)  # type: ignore
+            return
+
+        raw_songs = []
+        for raw_song in data:
+            # check timestamp first to not search songs that are
+            # redundant from last request (and therefore not needed)
+            played_at = self.get_played_at(raw_song)
+            if played_at == last_timestamp:
+                break
+
+            raw_songs.append((raw_song, played_at))
+
+        yield self.build_current_plays(channel_id, raw_songs, self._resolve_songs(raw_songs))
 
 
 class SongCollection:
 
-    def __init__(self, *, srf: SRF, playlist_id: str, name: str):
+    def __init__(self, *, srf: SRF, rule: PlaylistRule):
         self._srf: SRF = srf
-        self.playlist = SpotifyPlaylist(client=self._srf.spotify.client, id=playlist_id, name=name)
-        self.songs: SongsStorageFileHandler = SongsStorageFileHandler(f"./storage/songs_{name}.json")
-        self.current_songs: List[Song] = copy.deepcopy(self._srf.current_songs)
+        self.rule: PlaylistRule = rule
+        self.name: str = rule.name
+        # replaced by a virtual clock when replaying the play log
+        self.clock: Callable[[], float] = time.time
+        self.playlist = SpotifyPlaylist(
+            client=self._srf.spotify.client,
+            id=rule.playlist_id,
+            name=rule.name,
+            rate_limiter=self._srf.spotify.rate_limiter,
+        )
+        self.songs: Union[SongsStorageFileHandler, SongsStorageSQLiteHandler] = self._get_storage(self.name)
+        # storage reflects the playlist before this run's changes
+        self.playlist.set_known_uris(self.songs.get_in_playlist_uris())
+        self.current_plays: List[Play] = []
+        # songs in the playlist ordered by when they expire
+        self.expiry: ExpiryIndex = self._load_expiry()
+
+        # plays per song within the window, in buckets
+        self.counter: Optional[WindowCounter] = self._load_counter()
+        if self.counter is not None and not len(self.counter):
+            self.counter.rebuild(self.songs.get_all())
+
+        # ordered by (count, played_at), kept up to date on every play instead of sorting all songs
+        self.ranking: Optional[RankingIndex] = self._load_ranking()
+        if self.ranking is not None and not len(self.ranking):
+            self.ranking.rebuild(self.songs.get_all())
+
+    def __repr__(self) -> str:
+        return f"<SongCollection name={self.name!r}>"
+
+    def _load_expiry(self) -> ExpiryIndex:
+        expiry = ExpiryIndex(f"./storage/expiry_{self.name}.json", deadline=self.rule.deadline)
+        # the index is saved after the storage, so it's outdated if the run was interrupted in between
+        if expiry.position is None or expiry.position != self.log_position:
+            expiry.rebuild(self.songs.get_all())
+        return expiry
+
+    def _load_counter(self) -> Optional[WindowCounter]:
+        if self.rule.window is None:
+            return None
+        return WindowCounter(
+            f"./storage/counter_{self.name}.json",
+            window=self.rule.window,
+            bucket=self.rule.bucket,
+        )
+
+    def _load_ranking(self) -> Optional[RankingIndex]:
+        if self.rule.rank_limit is None:
+            return None
+        return RankingIndex(
+            f"./storage/ranking_{self.name}.json",
+            deadline=self.rule.deadline,
+            limit=self.rule.rank_limit,
+        )
+
+    def update(self, plays: List[Play]) -> None:
+        # plays are immutable, so collections share the same list unless it is filtered
+        position = self.log_position
+        if position is not None and plays and plays[-1].played_at <= position:
+            # skip plays which were already applied, e.g. replayed from the play log
+            plays = [play for play in plays if play.played_at > position]
+        self.current_plays = plays
+
+    def is_idle(self) -> bool:
+        # nothing to add without plays and nothing to remove before the next song expires
+        return not self.current_plays and not self.expiry.is_due(int(self.clock()))
+
+    @property
+    def log_position(self) -> Optional[int]:
+        # timestamp of the newest play of the log which is applied to this collection
+        positions = self._srf.metadata.get("log_positions") or {}
+        return positions.get(self.name)
+
+    @log_position.setter
+    def log_position(self, value: int) -> None:
+        with self._srf.metadata.lock():
+            positions = self._srf.metadata.get("log_positions") or {}
+            positions[self.name] = value
+            self._srf.metadata.set("log_positions", positions)
+
+    def _get_storage(self, name: str) -> Union[SongsStorageFileHandler, SongsStorageSQLiteHandler]:
+        json_path = f"./storage/songs_{name}.json"
+        if Env.STORAGE_BACKEND == "sqlite":
+            storage = SongsStorageSQLiteHandler("./storage/songs.db", collection=name)
+            storage.migrate_from_json(json_path)
+            return storage
+        else:
+            return SongsStorageFileHandler(json_path)
 
     def _get_current_songs(self) -> List[Song]:
         songs = []
-        for current_song in self.current_songs:
+        for play in self.current_plays:
             # check if song is already stored
-            stored_song = self.songs.get(current_song.uri)
+            stored_song = self.songs.get(play.uri)
             if stored_song is not None:
-                stored_song.played_at = current_song.played_at
+                stored_song.played_at = play.played_at
                 songs.append(stored_song)
             else:
-                songs.append(current_song)
+                songs.append(Song.from_play(play))
 
         return songs
 
-    def get_new_songs(self) -> List[Song]:
-        raise NotImplementedError
-
-    def get_old_songs(self) -> List[Song]:
-        raise NotImplementedError
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        try:
+            with self.songs.transaction():
+                yield
+                # only persist the indexes along with the storage
+                if self.counter is not None:
+                    self.counter.save()
+                if self.ranking is not None:
+                    # dropped songs are out of the playlist and past their deadline, a play starts them over
+                    for uri in self.ranking.prune(int(self.clock())):
+                        self.songs.delete(uri)
+                    self.ranking.save()
+        except BaseException:
+            # drop in-memory changes which were rolled back in storage
+            self.expiry = self._load_expiry()
+            self.counter = self._load_counter()
+            self.ranking = self._load_ranking()
+            raise
+
+        if self.current_plays:
+            self.log_position = self.current_plays[0].played_at
+        self.expiry.save(self.log_position)
+
+    def reset(self) -> None:
+        self.songs.clear()
+        self.expiry.clear()
+        if self.counter is not None:
+            self.counter.clear()
+        if self.ranking is not None:
+            self.ranking.rebuild([])
+
+    def _save_song(self, song: Song) -> None:
+        self.songs.set(song)
+        self.expiry.update(song)
 
+    def _is_past_deadline(self, song: Song) -> bool:
+        now = int(self.clock())
+        return now >= (song.retained_at + self.rule.deadline)
 
-class TrendingNowCollection(SongCollection):
+    def _count(self, song: Song) -> int:
+        if self.counter is not None:
+            return self.counter.add(song.uri, song.played_at)
 
-    REQUIRED_SONG_COUNT = 2
-    SONG_DEADLINE = int(datetime.timedelta(weeks=1).total_seconds())
+        # without a window, plays count until the song is past its deadline
+        if self._is_past_deadline(song):
+            return 1
+        return song.count + 1
 
-    def __init__(self, *, srf: SRF):
-        super().__init__(
-            srf=srf,
-            playlist_id=Env.SPOTIFY_TRENDING_NOW_PLAYLIST_ID,
-            name="trending_now",
-        )
+    def _expire_songs(self) -> List[Song]:
+        now = int(self.clock())
+        old_songs = []
+        for uri in self.expiry.pop_due(now):
+            song = self.songs.get(uri)
+            if song is None or not song.in_playlist:
+                continue
+            if now < song.retained_at + self.rule.deadline:
+                # retained in the meantime, keep track of it with the new deadline
+                self.expiry.update(song)
+                continue
+
+            self.songs.remove(song)
+            old_songs.append(song)
 
-    def _is_past_deadline(self, song: Song) -> bool:
-        now = int(time.time())
-        return now >= (song.retained_at + self.SONG_DEADLINE)
+        return old_songs
 
     def get_new_songs(self) -> List[Song]:
-        logger.info("get new songs for 'trending now'")
+        logger.info(f"get new songs for '{self.name}'")
 
         new_songs = []
         for song in self._get_current_songs():
-            # check retention to potentially prevent adding song
-            # that is not played enough
-            if self._is_past_deadline(song):
-                song.count = 0
-
-            song.count += 1
-            # if song reaches specific count, it's a trending song
-            if song.count >= self.REQUIRED_SONG_COUNT:
-                song.count = 0
-                # retain to prevent song being removed later
+            song.count = self._count(song)
+            # if song is played often enough, it's retained to prevent it being removed later
+            if song.count >= self.rule.threshold:
                 song.retain()
-                if not song.in_playlist:
+                if self.ranking is not None:
+                    self.ranking.update(song)
+                elif not song.in_playlist:
                     song.in_playlist = True
                     new_songs.append(song)
 
             # always update it in storage to update at least played_at timestamp
-            self.songs.set(song)
+            self._save_song(song)
+
+        if self.ranking is not None:
+            for uri in self.ranking.top(self.rule.rank_limit):  # type: ignore
+                # the expiry index holds exactly the songs in the playlist, so they aren't loaded again
+                if uri in self.expiry:
+                    continue
+                song = self.songs.get(uri)
+                if song is not None and not song.in_playlist:
+                    song.in_playlist = True
+                    self._save_song(song)
+                    new_songs.append(song)
 
         return new_songs
 
     def get_old_songs(self) -> List[Song]:
-        logger.info("get old songs for 'trending now'")
-        songs = self.songs.get_all()
-        old_songs = []
-        for song in songs:
-            # if it's past deadline, it wasn't played enough to be retained
-            if song.in_playlist and self._is_past_deadline(song):
-                self.songs.remove(song)
-                old_songs.append(song)
-
-        return old_songs
-
-
-class Top100Collection(SongCollection):
-
-    SONG_DEADLINE = int(datetime.timedelta(days=10).total_seconds())
-
-    def __init__(self, *, srf: SRF):
-        super().__init__(
-            srf=srf,
-            playlist_id=Env.SPOTIFY_TOP_100_PLAYLIST_ID,
-            name="top_100",
-        )
-
-    def _get_sorted_all_songs(self) -> List[Song]:
-        songs = self.songs.get_all()
-        # sort by ...
-        # 1. count, high to low
-        # 2. played_at, young (high) to old (low)
-        songs = sorted(songs, key=lambda x: (x.count, x.played_at), reverse=True)
-
-        return songs
-
-    def _is_past_deadline(self, song: Song) -> bool:
-        now = int(time.time())
-        return now >= (song.retained_at + self.SONG_DEADLINE)
-
-    def get_new_songs(self) -> List[Song]:
-        logger.info("get new songs for 'top 100'")
-
-        for song in self._get_current_songs():
-            # check retention to potentially prevent adding song
-            # that is not played enough
-            if self._is_past_deadline(song):
-                song.count = 0
-
-            song.count += 1
-            # retain to prevent song being removed later
-            song.retain()
-            self.songs.set(song)
-
-        sorted_all_songs = self._get_sorted_all_songs()
-        new_songs = []
-        for song in sorted_all_songs[:100]:
-            if not song.in_playlist:
-                song.in_playlist = True
-                self.songs.set(song)
-                new_songs.append(song)
-
-        return new_songs
+        logger.info(f"get old songs for '{self.name}'")
 
-    def get_old_songs(self) -> List[Song]:
-        logger.info("get old songs for 'top 100'")
+        # if it's past deadline, it wasn't played enough to be retained
+        old_songs = self._expire_songs()
+        if self.ranking is None:
+            return old_songs
 
-        old_songs = []
-        # remove songs which are not played anymore
-        all_songs = self.songs.get_all()
-        for song in all_songs:
-            if song.in_playlist and self._is_past_deadline(song):
-                self.songs.remove(song)
-                old_songs.append(song)
+        for song in old_songs:
+            self.ranking.remove(song)
 
-        # remove songs beyond top 100
-        sorted_all_songs = self._get_sorted_all_songs()
-        for song in sorted_all_songs[100:]:
-            if song.in_playlist:
+        # remove songs beyond the rank limit
+        for uri in self.ranking.pop_left(self.rule.rank_limit):  # type: ignore
+            song = self.songs.get(uri)
+            if song is not None and song.in_playlist:
                 song.in_playlist = False
-                self.songs.set(song)
-                old_songs.append(song)
-
-        return old_songs
-
-
-class NightOutCollection(SongCollection):
-
-    SONG_DEADLINE = int(datetime.timedelta(weeks=3).total_seconds())
-
-    def __init__(self, srf: SRF):
-        super().__init__(
-            srf=srf,
-            playlist_id=Env.SPOTIFY_NIGHT_OUT_PLAYLIST_ID,
-            name="night_out",
-        )
-
-    def _is_past_deadline(self, song: Song) -> bool:
-        now = int(time.time())
-        return now >= (song.retained_at + self.SONG_DEADLINE)
-
-    def _is_night_out_song(self, song: Song) -> bool:
-        tz = ZoneInfo("Europe/Zurich")
-        played_at = datetime.datetime.fromtimestamp(song.played_at).astimezone(tz)
-        return played_at.isoweekday() == 6 and played_at.hour >= 20
-
-    def get_new_songs(self) -> List[Song]:
-        logger.info("get new songs for 'night out'")
-
-        new_songs = []
-        for song in self._get_current_songs():
-            if self._is_night_out_song(song):
-                # retain to prevent song being removed later
-                song.retain()
-                if not song.in_playlist:
-                    song.in_playlist = True
-                    new_songs.append(song)
-
-                # always update it in storage to update at least played_at timestamp
-                self.songs.set(song)
-
-        return new_songs
-
-    def get_old_songs(self) -> List[Song]:
-        logger.info("get old songs for 'night out'")
-
-        songs = self.songs.get_all()
-        old_songs = []
-        for song in songs:
-            # if it's past deadline, it wasn't played enough to be retained
-            if song.in_playlist and self._is_past_deadline(song):
-                self.songs.remove(song)
+                self._save_song(song)
                 old_songs.append(song)
 
         return old_songs
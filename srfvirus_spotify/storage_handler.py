@@ -23,7 +23,12 @@ SOFTWARE.
 """
 
 import logging
-from typing import Any, Optional, List
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional, List, Iterator, Tuple
 
 from .json_file import JSONFile
 from .song import Song
@@ -45,7 +50,13 @@ class SongsStorageFileHandler:
         self._json_file.set(key=song.uri, value=song_info)
 
     def remove(self, song: Song) -> None:
-        self._json_file.delete(song.uri)
+        self.delete(song.uri)
+
+    def delete(self, uri: str) -> None:
+        self._json_file.delete(uri)
+
+    def clear(self) -> None:
+        self._json_file.write({})
 
     def get(self, uri: str) -> Optional[Song]:
         data = self._json_file.get(uri)
@@ -61,15 +72,168 @@ class SongsStorageFileHandler:
             songs.append(Song.from_storage_dict(data=song_info, uri=uri))
         return songs
 
+    def get_in_playlist_uris(self) -> List[str]:
+        # read straight from the stored dicts without building a Song per entry
+        return [uri for uri, song_info in self._json_file.read().items() if song_info["in_playlist"]]
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._json_file.session():
+            yield
+
+
+class SongsStorageSQLiteHandler:
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS songs (
+            collection TEXT NOT NULL,
+            uri TEXT NOT NULL,
+            title TEXT NOT NULL,
+            artist TEXT NOT NULL,
+            played_at INTEGER NOT NULL,
+            retained_at INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            in_playlist INTEGER NOT NULL,
+            PRIMARY KEY (collection, uri)
+        );
+        CREATE INDEX IF NOT EXISTS songs_retained_at ON songs (collection, retained_at);
+        CREATE INDEX IF NOT EXISTS songs_count ON songs (collection, count, played_at);
+        CREATE INDEX IF NOT EXISTS songs_in_playlist ON songs (collection, in_playlist);
+        CREATE TABLE IF NOT EXISTS migrations (
+            collection TEXT PRIMARY KEY,
+            migrated_at INTEGER NOT NULL
+        );
+    """
+    COLUMNS = "uri, title, artist, played_at, retained_at, count, in_playlist"
+
+    def __init__(self, db_path: str, *, collection: str):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.collection: str = collection
+        # autocommit unless inside of transaction()
+        self._conn: sqlite3.Connection = sqlite3.connect(db_path, isolation_level=None)
+        self._conn.executescript(self.SCHEMA)
+        self._in_transaction: bool = False
+
+    def _to_song(self, row: Tuple[Any, ...]) -> Song:
+        uri, title, artist, played_at, retained_at, count, in_playlist = row
+        return Song(
+            uri=uri,
+            title=title,
+            artist=artist,
+            played_at=played_at,
+            retained_at=retained_at,
+            count=count,
+            in_playlist=bool(in_playlist),
+        )
+
+    def set(self, song: Song) -> None:
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO songs (collection, {self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.collection,
+                song.uri,
+                song.title,
+                song.artist,
+                song.played_at,
+                song.retained_at,
+                song.count,
+                int(song.in_playlist),
+            ),
+        )
+
+    def remove(self, song: Song) -> None:
+        self.delete(song.uri)
+
+    def delete(self, uri: str) -> None:
+        self._conn.execute("DELETE FROM songs WHERE collection = ? AND uri = ?", (self.collection, uri))
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM songs WHERE collection = ?", (self.collection,))
+
+    def get(self, uri: str) -> Optional[Song]:
+        row = self._conn.execute(
+            f"SELECT {self.COLUMNS} FROM songs WHERE collection = ? AND uri = ?", (self.collection, uri)
+        ).fetchone()
+        if row is not None:
+            return self._to_song(row)
+        else:
+            return None
+
+    def get_all(self) -> List[Song]:
+        rows = self._conn.execute(
+            f"SELECT {self.COLUMNS} FROM songs WHERE collection = ?", (self.collection,)
+        )
+        return [self._to_song(row) for row in rows]
+
+    def get_in_playlist_uris(self) -> List[str]:
+        rows = self._conn.execute(
+            "SELECT uri FROM songs WHERE collection = ? AND in_playlist = 1", (self.collection,)
+        )
+        return [uri for uri, in rows]
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        if self._in_transaction:
+            yield
+            return
+
+        self._conn.execute("BEGIN")
+        self._in_transaction = True
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        else:
+            self._conn.execute("COMMIT")
+        finally:
+            self._in_transaction = False
+
+    def is_migrated(self) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM migrations WHERE collection = ?", (self.collection,)
+        ).fetchone()
+        return row is not None
+
+    def migrate_from_json(self, json_path: str) -> int:
+        # one-time import of an existing storage/songs_*.json file
+        if self.is_migrated():
+            return 0
+
+        count = 0
+        with self.transaction():
+            if os.path.exists(json_path):
+                for song in SongsStorageFileHandler(json_path).get_all():
+                    self.set(song)
+                    count += 1
+
+            self._conn.execute(
+                "INSERT INTO migrations (collection, migrated_at) VALUES (?, ?)",
+                (self.collection, int(time.time())),
+            )
+
+        logger.info(f"migrated {count} songs of '{self.collection}' from {json_path} to sqlite")
+        return count
+
 
 class SongsMetadataFileHandler:
 
     def __init__(self, storage_path: str):
         self.json_file: JSONFile = JSONFile(storage_path)
+        # channel workers update it concurrently
+        self._lock: threading.RLock = threading.RLock()
 
     def get(self, key: str) -> Optional[Any]:
-        metadata = self.json_file.get(key)
-        return metadata
+        with self._lock:
+            metadata = self.json_file.get(key)
+            return metadata
 
     def set(self, key: str, value: Any) -> None:
-        self.json_file.set(key=key, value=value)
+        with self._lock:
+            self.json_file.set(key=key, value=value)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        # for read-modify-write of a single key
+        with self._lock:
+            yield
@@ -0,0 +1,120 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Any, Optional
+
+from .cache_handler import TokenCacheFileHandler
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenManager:
+
+    # refresh this many seconds before the token expires
+    REFRESH_MARGIN = 300
+    RETRY_DELAY = 30
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        cache_handler: TokenCacheFileHandler,
+        refresh: Callable[[Dict[str, Any]], Dict[str, Any]],
+        refresh_margin: int = REFRESH_MARGIN,
+    ):
+        self.name: str = name
+        self.cache_handler: TokenCacheFileHandler = cache_handler
+        self.refresh_margin: int = refresh_margin
+        # receives the current (possibly empty) token info and returns a new one including "expires_at"
+        self._refresh: Callable[[Dict[str, Any]], Dict[str, Any]] = refresh
+
+        self._lock: threading.Lock = threading.Lock()
+        self._stop_event: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _needs_refresh(self, token_info: Dict[str, Any]) -> bool:
+        if not token_info:
+            return True
+
+        now = int(time.time())
+        return now >= (token_info["expires_at"] - self.refresh_margin)
+
+    def refresh(self) -> Dict[str, Any]:
+        with self._lock:
+            token_info = self.cache_handler.get_cached_token()
+            # another thread might have refreshed it while waiting for the lock
+            if not self._needs_refresh(token_info):
+                return token_info
+
+            token_info = self._refresh(token_info)
+            self.cache_handler.save_token_to_cache(token_info)
+
+        logger.info(f"refreshed {self.name} token")
+        return token_info
+
+    @property
+    def token_info(self) -> Dict[str, Any]:
+        token_info = self.cache_handler.get_cached_token()
+        # only happens if the background refresh is not running or failed
+        if self._needs_refresh(token_info):
+            token_info = self.refresh()
+        return token_info
+
+    @property
+    def access_token(self) -> str:
+        return self.token_info["access_token"]
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            token_info = self.cache_handler.get_cached_token()
+            if self._needs_refresh(token_info):
+                try:
+                    token_info = self.refresh()
+                except Exception:
+                    logger.exception(f"background refresh of {self.name} token failed")
+                    self._stop_event.wait(self.RETRY_DELAY)
+                    continue
+
+            wait = token_info["expires_at"] - self.refresh_margin - time.time()
+            self._stop_event.wait(max(wait, 1))
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,57 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+from contextlib import nullcontext
+from typing import Any, ContextManager, List, Optional, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+# the sentry sdk is only imported once it's initialized with a dsn, without one nothing would be sent anyway
+_sentry: Optional[Any] = None
+
+
+def init(*, dsn: Optional[str], traces_sample_rate: float, ignore_errors: List[Type[BaseException]]) -> None:
+    global _sentry
+    if not dsn:
+        return
+
+    import sentry_sdk
+
+    sentry_sdk.init(dsn=dsn, ignore_errors=ignore_errors, traces_sample_rate=traces_sample_rate)
+    _sentry = sentry_sdk
+
+
+def start_transaction(*, op: str, name: str) -> ContextManager[Any]:
+    if _sentry is None:
+        return nullcontext()
+    return _sentry.start_transaction(op=op, name=name)
+
+
+def start_span(*, op: str, name: str) -> ContextManager[Any]:
+    if _sentry is None:
+        return nullcontext()
+    return _sentry.start_span(op=op, name=name)
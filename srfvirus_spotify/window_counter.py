@@ -0,0 +1,119 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List
+
+from .json_file import JSONFile
+from .song import Song
+
+
+logger = logging.getLogger(__name__)
+
+
+class WindowCounter:
+
+    def __init__(self, path: str, *, window: int, bucket: int):
+        self.json_file: JSONFile = JSONFile(path)
+        self.window: int = window
+        self.bucket: int = bucket
+        # number of buckets which make up the window, older ones fall out like in a ring buffer
+        self.size: int = -(-window // bucket)
+
+        # per uri the non-empty buckets as [bucket number, plays], oldest first
+        self._buckets: Dict[str, Deque[List[int]]] = {}
+        self._totals: Dict[str, int] = {}
+        # newest play seen, saving drops every bucket which fell out of the window ending there
+        self._latest_played_at: int = 0
+
+        data = self.json_file.read()
+        if data.get("bucket") == self.bucket and data.get("window") == self.window:
+            for uri, flat in data.get("counts", {}).items():
+                buckets = deque([flat[i], flat[i + 1]] for i in range(0, len(flat), 2))
+                self._buckets[uri] = buckets
+                self._totals[uri] = sum(plays for _, plays in buckets)
+                self._latest_played_at = max(self._latest_played_at, buckets[-1][0] * self.bucket)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def rebuild(self, songs: Iterable[Song]) -> None:
+        # seed from the old single counters, their plays all count for the bucket of the last play
+        self.clear()
+        for song in songs:
+            if song.count > 0:
+                self._buckets[song.uri] = deque([[song.played_at // self.bucket, song.count]])
+                self._totals[song.uri] = song.count
+                self._latest_played_at = max(self._latest_played_at, song.played_at)
+
+    def clear(self) -> None:
+        self._buckets = {}
+        self._totals = {}
+        self._latest_played_at = 0
+
+    def _expire(self, uri: str, now: int) -> None:
+        buckets = self._buckets[uri]
+        first = now // self.bucket - self.size + 1
+        while buckets and buckets[0][0] < first:
+            self._totals[uri] -= buckets.popleft()[1]
+
+        if not buckets:
+            del self._buckets[uri]
+            del self._totals[uri]
+
+    def add(self, uri: str, played_at: int) -> int:
+        # returns the plays within the window ending at played_at
+        number = played_at // self.bucket
+        self._latest_played_at = max(self._latest_played_at, played_at)
+        buckets = self._buckets.setdefault(uri, deque())
+        self._totals.setdefault(uri, 0)
+
+        # plays come in newest first per batch, so an older bucket is at most a few steps back
+        i = len(buckets)
+        while i > 0 and buckets[i - 1][0] > number:
+            i -= 1
+        if i > 0 and buckets[i - 1][0] == number:
+            buckets[i - 1][1] += 1
+        else:
+            buckets.insert(i, [number, 1])
+        self._totals[uri] += 1
+
+        return self.count(uri, played_at)
+
+    def count(self, uri: str, now: int) -> int:
+        if uri not in self._buckets:
+            return 0
+        self._expire(uri, now)
+        return self._totals.get(uri, 0)
+
+    def save(self) -> None:
+        # songs which stopped playing are never counted again, so expire them here or they pile up
+        for uri in list(self._buckets):
+            self._expire(uri, self._latest_played_at)
+
+        counts = {
+            uri: [value for bucket in buckets for value in bucket] for uri, buckets in self._buckets.items()
+        }
+        self.json_file.write({"bucket": self.bucket, "window": self.window, "counts": counts})
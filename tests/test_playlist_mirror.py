@@ -0,0 +1,95 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from typing import List
+
+import pytest
+
+from srfvirus_spotify.outbox import PlaylistOutbox
+from srfvirus_spotify.playlist_mirror import PlaylistMirror
+from srfvirus_spotify.rate_limiter import RateLimiter
+from srfvirus_spotify.spotify import ADD, SpotifyPlaylist
+
+
+class FakePlaylist(SpotifyPlaylist):
+
+    def __init__(self, uris: List[str]):
+        super().__init__(
+            client=None,  # type: ignore
+            id="playlist",
+            name="playlist",
+            rate_limiter=RateLimiter(rate=1, capacity=1),
+        )
+        self.uris: List[str] = list(uris)
+        self.version: int = 0
+        self.pages: int = 0
+
+    def edit(self, uris: List[str]) -> None:
+        self.uris = uris
+        self.version += 1
+
+    def get_snapshot_id(self) -> str:
+        return f"snapshot-{self.version}"
+
+    def get_uris(self) -> List[str]:
+        self.pages += 1
+        return list(self.uris)
+
+    def send(self, op: str, items: List[str]) -> None:
+        if op == ADD:
+            self.edit(self.uris + items)
+        else:
+            self.edit([uri for uri in self.uris if uri not in items])
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_outside_edit_between_own_changes_is_paged(storage):
+    playlist = FakePlaylist(["a", "b"])
+    mirror = PlaylistMirror("./storage/playlist_mirror.json")
+    outbox = PlaylistOutbox("./storage/playlist_outbox.json")
+    assert mirror.refresh(playlist) == ["a", "b"]
+
+    outbox.enqueue_uris(playlist, add=["c"], remove=[])
+    outbox.drain([playlist], mirror)
+    # removed by hand before the next own change
+    playlist.edit([uri for uri in playlist.uris if uri != "a"])
+    outbox.enqueue_uris(playlist, add=["d"], remove=[])
+    outbox.drain([playlist], mirror)
+
+    assert mirror.refresh(playlist) == ["b", "c", "d"]
+    assert playlist.pages == 2
+
+
+def test_unchanged_playlist_is_not_paged(storage):
+    playlist = FakePlaylist(["a", "b"])
+    mirror = PlaylistMirror("./storage/playlist_mirror.json")
+    mirror.refresh(playlist)
+
+    assert mirror.refresh(playlist) == ["a", "b"]
+    assert playlist.pages == 1
@@ -0,0 +1,86 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import types
+from typing import List
+
+import pytest
+
+from srfvirus_spotify.rate_limiter import RateLimiter
+from srfvirus_spotify.rules import PlaylistRule
+from srfvirus_spotify.song import Play
+from srfvirus_spotify.srf import SongCollection
+from srfvirus_spotify.storage_handler import SongsMetadataFileHandler
+
+
+DEADLINE = 100
+
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    srf = types.SimpleNamespace(
+        spotify=types.SimpleNamespace(client=None, rate_limiter=RateLimiter(rate=1, capacity=1)),
+        metadata=SongsMetadataFileHandler("./storage/songs_metadata.json"),
+    )
+    rule = PlaylistRule(name="top", playlist_id="top", deadline=DEADLINE, rank_limit=2)
+    return SongCollection(srf=srf, rule=rule)  # type: ignore
+
+
+def run(collection: SongCollection, now: int, plays: List[Play]) -> None:
+    collection.clock = lambda: now
+    # newest first, like they come from SRF
+    collection.update(sorted(plays, key=lambda play: play.played_at, reverse=True))
+    with collection.transaction():
+        collection.get_new_songs()
+        collection.get_old_songs()
+
+
+def play(uri: str, played_at: int) -> Play:
+    return Play(uri=uri, title=uri, artist="artist", played_at=played_at)
+
+
+def run_until_stale(collection: SongCollection) -> None:
+    run(collection, 10, [play("a", 1), play("b", 2), play("c", 3), play("d", 4)])
+    run(collection, 50, [play("a", 50)])
+    assert sorted(collection.songs.get_in_playlist_uris()) == ["a", "d"]
+    # a and d expire, b is below the top and past its deadline
+    run(collection, 200, [play("e", 200)])
+
+
+def test_stale_songs_leave_ranking_and_storage(collection):
+    run_until_stale(collection)
+
+    assert sorted(song.uri for song in collection.songs.get_all()) == ["c", "e"]
+    assert collection.ranking.top(10) == ["e", "c"]
+
+
+def test_pruned_song_starts_over(collection):
+    run_until_stale(collection)
+    run(collection, 210, [play("b", 210)])
+
+    song = collection.songs.get("b")
+    assert song is not None
+    assert song.count == 1
+    assert song.retained_at == 210
@@ -0,0 +1,71 @@
+"""
+MIT License
+
+Copyright (c) 2025 codeofandrin
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from typing import List
+
+import pytest
+from spotipy import SpotifyException
+
+from srfvirus_spotify import spotify
+from srfvirus_spotify.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept: List[float] = []
+    monkeypatch.setattr(spotify.time, "sleep", slept.append)
+    return slept
+
+
+def failing(statuses: List[int]):
+    def func() -> str:
+        if statuses:
+            raise SpotifyException(statuses.pop(0), -1, "error", headers={"Retry-After": "0"})
+        return "ok"
+
+    return func
+
+
+def test_server_error_backs_off_without_slowing_down(sleeps):
+    rate_limiter = RateLimiter(rate=5, capacity=5)
+
+    assert spotify._call_with_retry(rate_limiter, failing([503, 500])) == "ok"
+    assert sleeps == [2, 4]
+    assert rate_limiter.rate == 5
+
+
+def test_rate_limit_halves_the_rate(sleeps):
+    rate_limiter = RateLimiter(rate=5, capacity=5)
+
+    assert spotify._call_with_retry(rate_limiter, failing([429])) == "ok"
+    # the wait comes from the rate limiter, no separate backoff
+    assert rate_limiter.rate < 5
+
+
+def test_server_error_is_not_retried_for_additions(sleeps):
+    rate_limiter = RateLimiter(rate=5, capacity=5)
+
+    with pytest.raises(SpotifyException):
+        spotify._call_with_retry(rate_limiter, failing([500]), idempotent=False)
+    assert sleeps == []